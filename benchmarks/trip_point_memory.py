@@ -0,0 +1,132 @@
+"""
+Compare trip point memory use of the old per-RightLight list layout against the shared, packed layout
+
+Run from the repository root:  python benchmarks/trip_point_memory.py
+
+The old layout held a dictionary of [datetime, [r, g, b]] lists for every mode in every RightLight.  It
+is measured directly for a few instances and scaled linearly, since 10,000 copies would need tens of GB.
+The shared layouts are measured directly at every instance count: "shared lists" is one copy of the old
+dictionary referenced by every instance, and "shared arrays" is the current TripPointTable.  The gap
+between those two also includes the color cycling modes, which the current layout no longer stores.
+
+The first table separates the two changes.  It compares one Normal curve held as [datetime, [ct, br]]
+lists against the same curve packed into a StaticCurve, so it measures the array layout alone.
+"""
+from datetime import datetime, timedelta
+import os, sys, tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import trip_points  # noqa: E402
+
+INSTANCE_COUNTS = (100, 1000, 10000)
+OLD_SAMPLE = 5
+
+
+class OldRightLight:
+    """Trip point state of a RightLight before the shared tables"""
+
+    def __init__(self, now, sunrise, sunset) -> None:
+        midnight_early = now.replace(microsecond=0, second=0, minute=0, hour=0)
+        midnight_late = now.replace(microsecond=0, second=59, minute=59, hour=23)
+
+        def enumerate_trip_points(time_step, palette):
+            # Entries share the palette's [r, g, b] lists, as the original defineTripPoints did
+            palette = [list(v) for v in palette]
+            temp = midnight_early
+            this_ptr = 0
+            toreturn = []
+            while temp < midnight_late:
+                toreturn.append([temp, palette[this_ptr]])
+                temp = temp + time_step
+                this_ptr = (this_ptr + 1) % len(palette)
+            return toreturn
+
+        self.trip_points = {
+            "Normal": [[t, list(v)] for t, v in _normalPoints(now, sunrise, sunset)]
+        }
+        for mode, curve in trip_points.CYCLIC_CURVES.items():
+            self.trip_points[mode] = enumerate_trip_points(curve.step, curve.palette)
+
+
+class SharedListRightLight:
+    """Trip point state of a RightLight referencing one shared copy of the old list layout"""
+
+    def __init__(self, table) -> None:
+        self.trip_points = table
+
+
+class NewRightLight:
+    """Trip point state of a RightLight with the shared tables"""
+
+    def __init__(self, now, sunrise, sunset) -> None:
+        self._trip_table = trip_points.getTripPoints(
+            now.date(), 0.0, 0.0, False, now, lambda: (sunrise, sunset)
+        )
+
+
+def _normalPoints(now, sunrise, sunset):
+    curve = trip_points._buildNormalCurve(now, sunrise, sunset)
+    return [
+        (curve.midnight + timedelta(milliseconds=offset), curve.values[i * curve.width:(i + 1) * curve.width])
+        for i, offset in enumerate(curve.offsets)
+    ]
+
+
+def measure(build):
+    """Return the bytes still allocated by what 'build()' returns"""
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    built = build()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del built
+    return after - before
+
+
+def measureInstances(cls, count, *args):
+    return measure(lambda: [cls(*args) for _ in range(count)])
+
+
+def measureSharedLists(count, now, sunrise, sunset):
+    def build():
+        table = OldRightLight(now, sunrise, sunset).trip_points
+        return table, [SharedListRightLight(table) for _ in range(count)]
+
+    return measure(build)
+
+
+def layout(now, sunrise, sunset):
+    """Print the size of one Normal curve in the list layout and in the packed array layout"""
+    lists = measure(lambda: [[t, list(v)] for t, v in _normalPoints(now, sunrise, sunset)])
+    arrays = measure(lambda: trip_points._buildNormalCurve(now, sunrise, sunset))
+
+    print(f"{'Normal curve':>14} {'bytes':>10}")
+    print(f"{'lists':>14} {lists:>10}")
+    print(f"{'arrays':>14} {arrays:>10}")
+    print(f"{'ratio':>14} {lists / arrays:>10.1f}")
+    print()
+
+
+def main():
+    now = datetime(2026, 6, 21, 12, 0, 0)
+    sunrise = now.replace(hour=5, minute=30)
+    sunset = now.replace(hour=21, minute=5)
+
+    layout(now, sunrise, sunset)
+
+    old_per_instance = measureInstances(OldRightLight, OLD_SAMPLE, now, sunrise, sunset) / OLD_SAMPLE
+
+    print(f"{'instances':>10} {'old (MiB)':>12} {'shared lists (MiB)':>19} {'shared arrays (MiB)':>20}")
+    for count in INSTANCE_COUNTS:
+        trip_points._tables.clear()
+        old = old_per_instance * count
+        shared_lists = measureSharedLists(count, now, sunrise, sunset)
+        shared_arrays = measureInstances(NewRightLight, count, now, sunrise, sunset)
+        print(
+            f"{count:>10} {old / 2**20:>12.1f} {shared_lists / 2**20:>19.3f} {shared_arrays / 2**20:>20.3f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
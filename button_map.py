@@ -0,0 +1,249 @@
+"""JSON button maps, compiled into command plans and hot reloaded by one integration-wide file watcher"""
+from datetime import timedelta
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.event import async_track_time_interval
+import asyncio, json, logging, os
+
+from .const import DOMAIN
+from .outbound import getBatcher
+from .trip_points import CYCLIC_CURVES
+
+_LOGGER = logging.getLogger(__name__)
+
+RELOAD_INTERVAL = timedelta(seconds=60)
+
+# RightLight modes a button map may select, as RightLight.getColorModes() reports them
+_MODES = frozenset(("Normal", *CYCLIC_CURVES))
+
+
+class BrightnessCommand:
+    """["Brightness", entity_id, brightness]: plain light service call, turning off at 0"""
+
+    __slots__ = ("entity_id", "service", "data")
+
+    def __init__(self, entity_id, brightness) -> None:
+        self.entity_id = entity_id
+        self.service = "turn_off" if brightness == 0 else "turn_on"
+        self.data = {"entity_id": entity_id} if brightness == 0 else {"entity_id": entity_id, "brightness": brightness}
+
+    async def async_run(self, zone) -> None:
+        await getBatcher(zone.hass).async_call("light", self.service, self.data)
+
+
+class RightLightCommand:
+    """["RightLight", entity_id, value]: value is "Disable", a RightLight mode, 0 or "Off", or a brightness"""
+
+    __slots__ = ("entity_id", "value")
+
+    def __init__(self, entity_id, value) -> None:
+        self.entity_id = entity_id
+        self.value = value
+
+    async def async_run(self, zone):
+        """Returns the light's pending send, since RightLight sends from its own timer after this returns"""
+        rl = zone._sceneTarget(self.entity_id)
+        if self.value == "Disable":
+            await rl.disable()
+        elif self.value in _MODES:
+            await rl.turn_on(mode=self.value, zone=zone.name)
+        elif self.value == 0 or self.value == "Off":
+            await rl.disable_and_turn_off(zone=zone.name)
+        else:
+            await rl.turn_on(brightness=self.value, brightness_override=0, zone=zone.name)
+        return rl.pendingSend()
+
+
+class ColorCommand:
+    """["Color", entity_id, r, g, b]: fixed color, at the mean of the channels as brightness"""
+
+    __slots__ = ("entity_id", "data")
+
+    def __init__(self, entity_id, r, g, b) -> None:
+        self.entity_id = entity_id
+        self.data = {"entity_id": entity_id, "rgb_color": [r, g, b], "brightness": sum([r, g, b]) / 3}
+
+    async def async_run(self, zone) -> None:
+        await zone._sceneTarget(self.entity_id).turn_on_specific(self.data, zone=zone.name)
+
+
+class SceneCommand:
+    """["Scene", entity_id]: activate a scene"""
+
+    __slots__ = ("entity_id",)
+
+    def __init__(self, entity_id) -> None:
+        self.entity_id = entity_id
+
+    async def async_run(self, zone) -> None:
+        await getBatcher(zone.hass).async_call("scene", "turn_on", {"entity_id": self.entity_id})
+
+
+async def async_runPlan(zone, plan):
+    """
+    Run a plan's commands concurrently, except that commands for the same entity keep their order.  Since
+    they all start in the same loop iteration, identical service calls are merged by the CommandBatcher.
+    Returns the futures of the RightLight sends still to go out.
+    """
+    chains = {}
+    for command in plan:
+        chains.setdefault(command.entity_id, []).append(command)
+
+    async def run(commands):
+        sent = None
+        for command in commands:
+            sent = await command.async_run(zone)
+        return sent
+
+    results = await asyncio.gather(*(run(commands) for commands in chains.values()), return_exceptions=True)
+    sends = []
+    for result in results:
+        if isinstance(result, Exception):
+            _LOGGER.error(f"{zone.name} button map command failed: {result!r}")
+        elif result is not None:
+            sends.append(result)
+    return sends
+
+
+def _entityId(value, domain):
+    if not isinstance(value, str) or not value.startswith(f"{domain}."):
+        raise ValueError(f"expected a {domain} entity_id, got {value!r}")
+    return value
+
+
+def _level(value):
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or not 0 <= value <= 255:
+        raise ValueError(f"expected a level from 0 to 255, got {value!r}")
+    return value
+
+
+def _compileCommand(command):
+    if not isinstance(command, list) or not command:
+        raise ValueError(f"expected a command list, got {command!r}")
+    kind, args = command[0], command[1:]
+
+    if kind == "Brightness" and len(args) == 2:
+        return BrightnessCommand(_entityId(args[0], "light"), _level(args[1]))
+    if kind == "RightLight" and len(args) == 2:
+        value = args[1]
+        if value not in ("Disable", "Off") and value not in _MODES:
+            _level(value)
+        return RightLightCommand(_entityId(args[0], "light"), value)
+    if kind == "Color" and len(args) == 4:
+        return ColorCommand(_entityId(args[0], "light"), *(_level(v) for v in args[1:]))
+    if kind == "Scene" and len(args) == 1:
+        return SceneCommand(_entityId(args[0], "scene"))
+    raise ValueError(f"unrecognized command {command!r}")
+
+
+def _compilePlan(plan):
+    # An empty plan would use up a press in the cycle without doing anything
+    if not isinstance(plan, list) or not plan:
+        raise ValueError(f"expected a non-empty list of commands, got {plan!r}")
+    return tuple(_compileCommand(c) for c in plan)
+
+
+def compileButtonMap(raw):
+    """
+    Return {button: (plan, ...)} for a decoded button map, each plan a tuple of command objects run in
+    order on successive presses.  Raises ValueError describing the first problem found.
+    """
+    if not isinstance(raw, dict):
+        raise ValueError("expected an object of button names")
+    compiled = {}
+    for button, plans in raw.items():
+        if not isinstance(plans, list) or not plans:
+            raise ValueError(f"{button}: expected a non-empty list of command lists")
+        try:
+            compiled[button] = tuple(_compilePlan(plan) for plan in plans)
+        except (TypeError, ValueError) as err:
+            raise ValueError(f"{button}: {err}") from None
+    return compiled
+
+
+def _loadButtonMap(path):
+    with open(path) as fh:
+        return compileButtonMap(json.load(fh))
+
+
+def _statAll(paths):
+    """Return {path: mtime} for the paths that exist"""
+    mtimes = {}
+    for path in paths:
+        try:
+            mtimes[path] = os.path.getmtime(path)
+        except OSError:
+            pass
+    return mtimes
+
+
+class ButtonMapWatcher:
+    """
+    Polls every zone's button map file from one timer, with the stat calls and loading done in the
+    executor.  A changed file is compiled before it replaces the live map, so a malformed edit is logged
+    and the previous map stays in use.
+    """
+
+    def __init__(self, hass: HomeAssistant) -> None:
+        self._hass = hass
+        self._watches = {}
+        """Dictionary of path to list of callbacks taking the compiled map"""
+        self._mtimes = {}
+        """Dictionary of path to modification time of the last version loaded or rejected"""
+        self._maps = {}
+        """Dictionary of path to last compiled map"""
+        self._unsub = None
+
+    async def async_watch(self, path, on_load):
+        """
+        Call 'on_load(compiled_map)' now if 'path' has a valid map, and again whenever it changes.
+        Returns an unsubscribe callable.
+        """
+        self._watches.setdefault(path, []).append(on_load)
+        if self._unsub is None:
+            self._unsub = async_track_time_interval(self._hass, self._async_poll, RELOAD_INTERVAL)
+
+        if path in self._maps:
+            on_load(self._maps[path])
+        else:
+            await self._async_poll(paths=[path])
+
+        @callback
+        def unsubscribe():
+            callbacks = self._watches.get(path, [])
+            if on_load in callbacks:
+                callbacks.remove(on_load)
+            if not callbacks:
+                self._watches.pop(path, None)
+                self._mtimes.pop(path, None)
+                self._maps.pop(path, None)
+            if not self._watches and self._unsub is not None:
+                self._unsub()
+                self._unsub = None
+
+        return unsubscribe
+
+    async def _async_poll(self, _now=None, paths=None) -> None:
+        mtimes = await self._hass.async_add_executor_job(_statAll, list(paths or self._watches))
+        for path, mtime in mtimes.items():
+            if mtime <= self._mtimes.get(path, 0):
+                continue
+            self._mtimes[path] = mtime
+
+            try:
+                compiled = await self._hass.async_add_executor_job(_loadButtonMap, path)
+            except (OSError, ValueError) as err:
+                _LOGGER.error(f"Rejected button map {path}, keeping the previous one: {err}")
+                continue
+
+            _LOGGER.debug(f"Loaded button map {path}: {len(compiled)} buttons")
+            self._maps[path] = compiled
+            for on_load in self._watches.get(path, ()):
+                on_load(compiled)
+
+
+def getButtonMapWatcher(hass: HomeAssistant) -> ButtonMapWatcher:
+    """Return the integration-wide ButtonMapWatcher, creating it on first use"""
+    data = hass.data.setdefault(DOMAIN, {})
+    if "button_maps" not in data:
+        data["button_maps"] = ButtonMapWatcher(hass)
+    return data["button_maps"]
@@ -0,0 +1,3 @@
+"""Constants for the New Zone Light integration"""
+
+DOMAIN = "new_zone_light"
@@ -0,0 +1,79 @@
+"""Shared boundary timers for the color cycling modes"""
+from datetime import timedelta
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.util import dt
+import logging
+
+from .const import DOMAIN
+from .trip_points import CYCLIC_CURVES
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class CycleTicker:
+    """
+    Keeps one timer per color cycling mode, firing at that mode's next trip point boundary.  Every
+    RightLight subscribed to the mode is advanced in one pass, with the next color looked up once.
+    """
+
+    def __init__(self, hass: HomeAssistant) -> None:
+        self._hass = hass
+        self._subscribers = {}
+        """Dictionary of mode to an insertion-ordered dictionary of subscribed RightLight objects"""
+        self._timers = {}
+        """Dictionary of mode to (boundary, timer handle)"""
+        self.ticks = 0
+        """Number of boundaries processed"""
+
+    @staticmethod
+    def handles(mode) -> bool:
+        """Return True if 'mode' is a color cycling mode the ticker can advance"""
+        return mode in CYCLIC_CURVES
+
+    def subscribe(self, mode, rl, boundary) -> None:
+        """Advance 'rl' at every boundary of 'mode' from 'boundary' on, until it unsubscribes"""
+        self._subscribers.setdefault(mode, {})[rl] = None
+        if mode not in self._timers:
+            self._arm(mode, boundary)
+
+    def unsubscribe(self, mode, rl) -> None:
+        subscribers = self._subscribers.get(mode)
+        if not subscribers or rl not in subscribers:
+            return
+        del subscribers[rl]
+        if not subscribers and mode in self._timers:
+            self._timers.pop(mode)[1].cancel()
+
+    def _arm(self, mode, boundary) -> None:
+        delay = max(0, (boundary - dt.now()).total_seconds())
+        self._timers[mode] = (boundary, self._hass.loop.call_later(delay, self._onTick, mode, boundary))
+
+    @callback
+    def _onTick(self, mode, boundary) -> None:
+        self._timers.pop(mode, None)
+        subscribers = self._subscribers.get(mode)
+        if not subscribers:
+            return
+
+        _, next_time, _, next_values = CYCLIC_CURVES[mode].lookup(boundary + timedelta(microseconds=1))
+        if next_time <= boundary:
+            # Past the day's last trip point, so wait for the cycle to restart at midnight
+            midnight = (boundary + timedelta(days=1)).replace(microsecond=0, second=0, minute=0, hour=0)
+            self._arm(mode, midnight)
+            return
+
+        self.ticks += 1
+        _LOGGER.debug(f"{mode} tick at {boundary}: {len(subscribers)} lights to {next_values} by {next_time}")
+
+        # Arm first, so a RightLight dropping out during the pass doesn't leave the timer cancelled
+        self._arm(mode, next_time)
+        for rl in list(subscribers):
+            rl._advanceCycle(next_time, next_values)
+
+
+def getTicker(hass: HomeAssistant) -> CycleTicker:
+    """Return the integration-wide CycleTicker, creating it on first use"""
+    data = hass.data.setdefault(DOMAIN, {})
+    if "ticker" not in data:
+        data["ticker"] = CycleTicker(hass)
+    return data["ticker"]
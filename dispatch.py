@@ -0,0 +1,210 @@
+"""Integration-wide event listeners that route switch and sensor events to the zones that want them"""
+from homeassistant.components import mqtt
+from homeassistant.core import HomeAssistant, callback
+from typing import NamedTuple
+import asyncio, json, logging, re
+
+from .const import DOMAIN
+
+try:
+    from orjson import loads as _loads
+except ImportError:
+    _loads = json.loads
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class ZhaEventDispatcher:
+    """Single zha_event listener, dispatching each event to the handlers registered for its device_ieee"""
+
+    def __init__(self, hass: HomeAssistant) -> None:
+        self._hass = hass
+        self._handlers = {}
+        """Dictionary of device_ieee to list of coroutine handlers"""
+        self._unsub = None
+
+    def subscribe(self, device_ieee, handler):
+        """Call 'handler(event)' for every zha_event from 'device_ieee'.  Returns an unsubscribe callable."""
+        if self._unsub is None:
+            self._unsub = self._hass.bus.async_listen("zha_event", self._onEvent)
+        self._handlers.setdefault(device_ieee, []).append(handler)
+
+        @callback
+        def unsubscribe():
+            handlers = self._handlers.get(device_ieee, [])
+            if handler in handlers:
+                handlers.remove(handler)
+            if not handlers:
+                self._handlers.pop(device_ieee, None)
+            if not self._handlers and self._unsub is not None:
+                self._unsub()
+                self._unsub = None
+
+        return unsubscribe
+
+    @callback
+    def _onEvent(self, ev) -> None:
+        for handler in self._handlers.get(ev.data.get("device_ieee"), ()):
+            self._hass.async_create_task(handler(ev))
+
+
+class MqttHub:
+    """
+    Wildcard subscriptions to every zigbee2mqtt device topic and action topic, routing each message to the
+    handlers registered for its exact topic.  Zones opting in share these two subscriptions instead of
+    subscribing per switch and per motion sensor.
+    """
+
+    ACTION_TOPIC = "zigbee2mqtt/+/action"
+    DEVICE_TOPIC = "zigbee2mqtt/+"
+    _COVERED = re.compile(r"zigbee2mqtt/[^/+#]+(/action)?")
+
+    def __init__(self, hass: HomeAssistant) -> None:
+        self._hass = hass
+        self._routes = {}
+        """Dictionary of topic to list of coroutine handlers"""
+        self._unsubs = None
+        self._lock = asyncio.Lock()
+
+    @classmethod
+    def covers(cls, topic) -> bool:
+        """Return True if messages on 'topic' arrive through the hub's wildcard subscriptions"""
+        return cls._COVERED.fullmatch(topic) is not None
+
+    async def async_subscribe(self, topic, handler):
+        """Call 'handler(msg)' for every message on 'topic'.  Returns an unsubscribe callable."""
+        async with self._lock:
+            if self._unsubs is None:
+                self._unsubs = [
+                    await mqtt.async_subscribe(self._hass, self.ACTION_TOPIC, self._onMessage),
+                    await mqtt.async_subscribe(self._hass, self.DEVICE_TOPIC, self._onMessage),
+                ]
+                _LOGGER.debug(f"MQTT hub subscribed to {self.ACTION_TOPIC} and {self.DEVICE_TOPIC}")
+        self._routes.setdefault(topic, []).append(handler)
+
+        @callback
+        def unsubscribe():
+            handlers = self._routes.get(topic, [])
+            if handler in handlers:
+                handlers.remove(handler)
+            if not handlers:
+                self._routes.pop(topic, None)
+            if not self._routes and self._unsubs is not None:
+                for unsub in self._unsubs:
+                    unsub()
+                self._unsubs = None
+
+        return unsubscribe
+
+    @callback
+    def _onMessage(self, msg) -> None:
+        for handler in self._routes.get(msg.topic, ()):
+            self._hass.async_create_task(handler(msg))
+
+
+class MotionEvent(NamedTuple):
+    """Decoded zigbee2mqtt motion sensor message"""
+
+    sensor: str
+    """Sensor name, the last topic level"""
+    topic: str
+    occupancy: bool
+
+
+class MotionSensorHub:
+    """
+    One MQTT subscription per zigbee2mqtt motion sensor topic, however many zones list the sensor.  Each
+    payload is decoded once, its occupancy cached, and a MotionEvent delivered to every interested zone.
+    A zone joining a topic that is already subscribed gets the cached occupancy, since the broker won't
+    resend a retained message for a subscription that already exists.
+    """
+
+    def __init__(self, hass: HomeAssistant) -> None:
+        self._hass = hass
+        self._handlers = {}
+        """Dictionary of topic to list of coroutine handlers"""
+        self._unsubs = {}
+        """Dictionary of topic to MQTT unsubscribe callable"""
+        self._lock = asyncio.Lock()
+        self.occupancy = {}
+        """Dictionary of topic to last decoded occupancy"""
+        self.decoded = 0
+        """Number of payloads decoded"""
+
+    async def async_subscribe(self, topic, handler, use_mqtt_hub=False):
+        """
+        Call 'handler(motion_event)' for every occupancy report on 'topic'.  Returns an unsubscribe callable.
+
+        :param use_mqtt_hub: Receive the topic through the shared MqttHub if it covers it
+        """
+        async with self._lock:
+            if topic not in self._unsubs:
+                if use_mqtt_hub and MqttHub.covers(topic):
+                    unsub = await getMqttHub(self._hass).async_subscribe(topic, self._async_onMessage)
+                else:
+                    unsub = await mqtt.async_subscribe(self._hass, topic, self._async_onMessage)
+                self._unsubs[topic] = unsub
+        self._handlers.setdefault(topic, []).append(handler)
+        if self.occupancy.get(topic):
+            self._hass.async_create_task(handler(_motionEvent(topic, True)))
+
+        @callback
+        def unsubscribe():
+            handlers = self._handlers.get(topic, [])
+            if handler in handlers:
+                handlers.remove(handler)
+            if not handlers:
+                self._handlers.pop(topic, None)
+                self.occupancy.pop(topic, None)
+                if topic in self._unsubs:
+                    self._unsubs.pop(topic)()
+
+        return unsubscribe
+
+    async def _async_onMessage(self, msg) -> None:
+        try:
+            payload = _loads(msg.payload)
+        except ValueError as err:
+            _LOGGER.error(f"Undecodable motion sensor payload on {msg.topic}: {err}")
+            return
+        self.decoded += 1
+
+        # Availability, battery and other reports without occupancy are not motion events
+        if not isinstance(payload, dict) or "occupancy" not in payload:
+            return
+
+        occupancy = payload["occupancy"] == "on" or payload["occupancy"] is True
+        self.occupancy[msg.topic] = occupancy
+        ev = _motionEvent(msg.topic, occupancy)
+        _LOGGER.debug(f"Motion sensor {ev.sensor}: {payload}")
+
+        for handler in self._handlers.get(msg.topic, ()):
+            self._hass.async_create_task(handler(ev))
+
+
+def _motionEvent(topic, occupancy) -> MotionEvent:
+    return MotionEvent(topic.rsplit("/", 1)[-1], topic, occupancy)
+
+
+def getZhaDispatcher(hass: HomeAssistant) -> ZhaEventDispatcher:
+    """Return the integration-wide ZhaEventDispatcher, creating it on first use"""
+    data = hass.data.setdefault(DOMAIN, {})
+    if "zha" not in data:
+        data["zha"] = ZhaEventDispatcher(hass)
+    return data["zha"]
+
+
+def getMqttHub(hass: HomeAssistant) -> MqttHub:
+    """Return the integration-wide MqttHub, creating it on first use"""
+    data = hass.data.setdefault(DOMAIN, {})
+    if "mqtt_hub" not in data:
+        data["mqtt_hub"] = MqttHub(hass)
+    return data["mqtt_hub"]
+
+
+def getMotionSensorHub(hass: HomeAssistant) -> MotionSensorHub:
+    """Return the integration-wide MotionSensorHub, creating it on first use"""
+    data = hass.data.setdefault(DOMAIN, {})
+    if "motion" not in data:
+        data["motion"] = MotionSensorHub(hass)
+    return data["motion"]
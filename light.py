@@ -1,17 +1,15 @@
 """Platform for light integration"""
 from __future__ import annotations
-from datetime import timedelta
-from homeassistant.helpers.event import async_call_later, async_track_time_interval
 
 ## TODO: Pull rgb_color property from RightLight (or any on entity)
 ## TODO: Look ingo rgbw_color/rgbww_color.  Need to use ColorMode.RGBW/RGBWW.
 
-import json
 import logging, logging.handlers
-import sys, os
+import sys
 import voluptuous as vol
 import asyncio
 import re
+import time
 from homeassistant.components import mqtt
 
 from homeassistant.components.light import (  # ATTR_EFFECT,; ATTR_FLASH,; ATTR_WHITE_VALUE,; PLATFORM_SCHEMA,; SUPPORT_EFFECT,; SUPPORT_FLASH,; SUPPORT_WHITE_VALUE,; ATTR_SUPPORTED_COLOR_MODES,
@@ -52,9 +50,16 @@ from homeassistant.helpers import event
 from homeassistant.helpers.entity import generate_entity_id
 from homeassistant.util import slugify
 from homeassistant.helpers.entity_platform import AddEntitiesCallback
+from homeassistant.helpers.event import async_call_later
+from homeassistant.helpers.restore_state import RestoreEntity
 from homeassistant.helpers.typing import ConfigType, DiscoveryInfoType
 
-from .right_light import RightLight
+from . import sun_times, trip_points
+from .button_map import async_runPlan, getButtonMapWatcher
+from .dispatch import getMotionSensorHub, getMqttHub, getZhaDispatcher
+from .const import DOMAIN
+from .outbound import getBatcher, PRIORITY_BACKGROUND, PRIORITY_INTERACTIVE, PRIORITY_MOTION
+from .registry import getRegistry
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -80,6 +85,10 @@ CONF_ENTITIES_BELOW_THRESHOLD = "entities_below_threshold"
 CONF_ENTITIES_ABOVE_THRESHOLD = "entities_above_threshold"
 CONF_BRIGHTNESS_MULTIPLIER = "brightness_multiplier"
 CONF_BUTTON_MAP = "button_map"
+CONF_FAN_OUT_LIMIT = "fan_out_limit"
+CONF_MQTT_HUB = "mqtt_hub"
+CONF_RATE_LIMIT = "rate_limit"
+CONF_SCENE_TARGET_LIMIT = "scene_target_limit"
 CONF_DEBUG = "debug"
 CONF_DEBUG_RL = "debug_rl"
 
@@ -102,6 +111,10 @@ PLATFORM_SCHEMA = PLATFORM_SCHEMA.extend(
         vol.Optional(CONF_OTHER_LIGHT_TRACKERS): cv.ensure_list,
         vol.Optional(CONF_TRACK_OTHER_LIGHT_OFF_EVENTS): cv.boolean,
         vol.Optional(CONF_BRIGHTNESS_MULTIPLIER): cv.ensure_list,
+        vol.Optional(CONF_FAN_OUT_LIMIT): vol.All(cv.positive_int, vol.Range(min=1)),
+        vol.Optional(CONF_MQTT_HUB): cv.boolean,
+        vol.Optional(CONF_RATE_LIMIT): vol.All(cv.positive_int, vol.Range(min=1)),
+        vol.Optional(CONF_SCENE_TARGET_LIMIT): vol.All(cv.positive_int, vol.Range(min=1)),
         vol.Optional(CONF_DEBUG): cv.boolean,
         vol.Optional(CONF_DEBUG_RL): cv.boolean,
     }
@@ -109,7 +122,10 @@ PLATFORM_SCHEMA = PLATFORM_SCHEMA.extend(
 
 async def async_setup_platform(hass: HomeAssistant, config: ConfigType, async_add_entities: AddEntitiesCallback, discovery_info: DiscoveryInfoType | None = None) -> None:
     """Set up the New Zone Light configuration"""
-    
+
+    # Compute sunrise/sunset off the event loop before any RightLight needs them
+    await sun_times.async_setup(hass)
+
     nzl = NewZoneLight(config.get(CONF_NAME), unique_id=config.get(CONF_UNIQUE_ID), debug=config.get(CONF_DEBUG, False), debug_rl=config.get(CONF_DEBUG_RL, False))
 
     if config.get(CONF_ENTITIES):
@@ -172,11 +188,27 @@ async def async_setup_platform(hass: HomeAssistant, config: ConfigType, async_ad
                 temp_dict[ent] = br
         nzl.brightness_multiplier = temp_dict
 
+    if config.get(CONF_FAN_OUT_LIMIT):
+        nzl.fan_out_limit = config.get(CONF_FAN_OUT_LIMIT)
+    if config.get(CONF_MQTT_HUB):
+        nzl.mqtt_hub = config.get(CONF_MQTT_HUB)
+    if config.get(CONF_SCENE_TARGET_LIMIT):
+        nzl.scene_target_limit = config.get(CONF_SCENE_TARGET_LIMIT)
+    if config.get(CONF_RATE_LIMIT):
+        # Integration-wide, so the last zone to set it wins
+        getBatcher(hass).setRateLimit(config.get(CONF_RATE_LIMIT))
+
     async_add_entities([nzl])
     _LOGGER.debug(f"{nzl.name}: Done")
 
 
-class NewZoneLight(LightEntity):
+# After a restart, zones that were on re-assert their restored state RESTORE_DELAY seconds after startup,
+# one zone every RESTORE_STAGGER seconds
+RESTORE_DELAY = 10
+RESTORE_STAGGER = 2
+
+
+class NewZoneLight(LightEntity, RestoreEntity):
     """New Light Super Class"""
 
     _attr_supported_features = LightEntityFeature.EFFECT | LightEntityFeature.TRANSITION
@@ -190,8 +222,11 @@ class NewZoneLight(LightEntity):
 
         super().__init__()
 
-        # Store callback for cancelling scheduled next event per motion sensor
-        self._currSched = {}
+        # Motion sensor timeouts: last report time per occupied sensor, expired by one timer per zone
+        self._motion_last_seen = {}
+        """Dictionary of occupied motion sensor to loop time of its last occupancy report"""
+        self._motion_timer = None
+        """Timer handle for the earliest motion sensor timeout, or None"""
 
         self.entities = {}
         """Dictionary of entities.  Each will be a rightlight object and be addressable from the json buttonmap.  The first
@@ -245,6 +280,12 @@ class NewZoneLight(LightEntity):
         self.default_transition = 0.1
         """Default transition when no source is known"""
 
+        self.fan_out_limit = 8
+        """Maximum number of this zone's light service calls in flight at once (1 sends them in sequence)"""
+
+        self.mqtt_hub = False
+        """Receive zigbee2mqtt switch and motion sensor messages through the shared wildcard subscriptions"""
+
         self.other_light_trackers = {}
         """Dictionary of entity=brightness values that turn this light on to brightness when entity turns on"""
 
@@ -308,10 +349,10 @@ class NewZoneLight(LightEntity):
         """Store the current effect being used"""
         self._button_map_file = f"custom_components/{domain}/{self.name}_button_map.json"
         """Name of the optional JSON button map file"""
-        self._button_map_timestamp = 0
-        """Store timestamp of previously loaded button map file"""
-        self._button_map_data = {}
-        """Data loaded from optional JSON button map script"""
+        self._button_map = {}
+        """Compiled button map, button name to tuple of command plans"""
+        self._button_latency_ms = {}
+        """Dictionary of button name to milliseconds from its last press until its plan's last service call completed"""
         # self._effect: Optional[str] = None
         self._supported_features: int = 0
         #"""Supported features of this light.  OR togther SUPPORT_BRIGHTNESS, SUPPORT_COLOR_TEMP, SUPPORT_COLOR, SUPPORT_TRANSITION"""
@@ -354,6 +395,28 @@ class NewZoneLight(LightEntity):
         self._others = {}
         """Dictionary of states of other lights being tracked"""
 
+        self._fan_out_ms = None
+        """Milliseconds from the start of the last member fan-out until every member's send had gone out"""
+
+        self._desired = []
+        """(method, kwargs, future) targets from motion, switch or tracker input not yet applied, oldest first"""
+        self._reconciler = None
+        """Task applying desired targets one at a time, or None when idle"""
+        self._superseded = 0
+        """Number of desired targets dropped because a newer one arrived first"""
+
+        self._applied = {}
+        """Dictionary of member entity to the last command async_turn_on sent it"""
+        self._commanded_since_restore = False
+        """True once any command has reached the zone since startup, so re-asserting restored state is skipped"""
+        self._unchanged = 0
+        """Number of member commands skipped because the member already had them"""
+
+        self._scene_targets = {}
+        """Button-map target entities that aren't zone members, to RightLight, least recently used first"""
+        self.scene_target_limit = 16
+        """Maximum number of non-member button-map targets to keep a RightLight hold on"""
+
         self._unsubs: list = []
         """List of unsubscribe callables for MQTT/event subscriptions, drained
         in async_will_remove_from_hass to avoid leaks on entity removal."""
@@ -384,7 +447,7 @@ class NewZoneLight(LightEntity):
 
         # Instantiate per-entity rightlight objects
         for entname in list(self.entities.keys()):
-            self.entities[entname] = RightLight(entname, self.hass, self._debug_rl)
+            self.entities[entname] = getRegistry(self.hass).acquire(entname, self._debug_rl)
 
             # Add RightLight color mode to effects list
             #self._effect_list = ["Normal"] + self.entities[entname].getColorModes()
@@ -392,13 +455,13 @@ class NewZoneLight(LightEntity):
                 self._effect_list = self.entities[entname].getColorModes()
 
         for entname in self.entities_above_threshold:
-            self.entities_above_threshold[entname] = RightLight(entname, self.hass, self._debug_rl)
+            self.entities_above_threshold[entname] = getRegistry(self.hass).acquire(entname, self._debug_rl)
 
             if not self._effect_list:
                 self._effect_list = self.entities_above_threshold[entname].getColorModes()
         
         for entname in self.entities_below_threshold:
-            self.entities_below_threshold[entname] = RightLight(entname, self.hass, self._debug_rl)
+            self.entities_below_threshold[entname] = getRegistry(self.hass).acquire(entname, self._debug_rl)
 
             if not self._effect_list:
                 self._effect_list = self.entities_below_threshold[entname].getColorModes()
@@ -406,9 +469,9 @@ class NewZoneLight(LightEntity):
         # Subscribe to switch events
         if self.switch != None:
             if ":" in self.switch:
-                # ZHA type switch
+                # ZHA type switch, routed by device_ieee from the shared zha_event listener
                 self._unsubs.append(
-                    self.hass.bus.async_listen("zha_event", self.switch_message_received)
+                    getZhaDispatcher(self.hass).subscribe(self.switch, self.switch_message_received)
                 )
             else:
                 # Zigbee2mqtt type switch
@@ -417,7 +480,7 @@ class NewZoneLight(LightEntity):
                 else:
                     switch_action = f"zigbee2mqtt/{self.switch}/action"
                 self._unsubs.append(
-                    await mqtt.async_subscribe(self.hass, switch_action, self.switch_message_received)
+                    await self._async_mqtt_subscribe(switch_action, self.switch_message_received)
                 )
 
         # Subscribe to motion sensor events
@@ -434,7 +497,9 @@ class NewZoneLight(LightEntity):
                 else:
                     action = f"zigbee2mqtt/{ms}"
                 self._unsubs.append(
-                    await mqtt.async_subscribe(self.hass, action, self.motion_sensor_message_received)
+                    await getMotionSensorHub(self.hass).async_subscribe(
+                        action, self.motion_sensor_message_received, self.mqtt_hub
+                    )
                 )
 
         # if self.has_motion_sensor:
@@ -469,20 +534,81 @@ class NewZoneLight(LightEntity):
 #                )
 #            )
 
-        # Periodic button-map reload (replaces the on-poll reload that lived
-        # in async_update). 60s is plenty for a config file.
+        # Cap this zone's service calls in flight where they are sent, after merging
+        getBatcher(self.hass).setZoneLimit(self.name, self.fan_out_limit)
+
+        # Button map, loaded now if present and reloaded by the shared watcher when the file changes
         self._unsubs.append(
-            async_track_time_interval(
-                self.hass, self._async_reload_button_map, timedelta(seconds=60)
-            )
+            await getButtonMapWatcher(self.hass).async_watch(self._button_map_file, self._button_map_loaded)
         )
-        # Run once now so the map is available immediately.
-        await self._async_reload_button_map()
+
+        await self._async_restore()
 
         self.async_write_ha_state()
 
+    async def _async_restore(self) -> None:
+        """Restore brightness, effect, switch and occupancy state from before a restart, and schedule re-asserting it"""
+        last = await self.async_get_last_state()
+        if last is None or last.state != "on":
+            return
+        attrs = last.attributes
+        _LOGGER.debug(f"{self.name} restoring: {attrs}")
+
+        self._is_on = True
+        self._brightness = attrs.get(ATTR_BRIGHTNESS) or 255
+        self._brightness_override = attrs.get("brightness_override") or 0
+        self._switched_on = bool(attrs.get("switched_on"))
+        if attrs.get(ATTR_EFFECT) in (self._effect_list or ()):
+            self._curr_effect = attrs[ATTR_EFFECT]
+
+        # Sensors occupied before the restart time out as usual unless they report again
+        now = self.hass.loop.time()
+        for ms in attrs.get("occupied_sensors") or ():
+            if ms in self._occupancies:
+                self._occupancies[ms] = True
+            elif ms in self._full_brightness_occupancies:
+                self._full_brightness_occupancies[ms] = True
+            else:
+                continue
+            self._motion_last_seen[ms] = now
+        self._occupancy = any(self._occupancies.values())
+        self._full_brightness_occupancy = any(self._full_brightness_occupancies.values())
+        self._armMotionTimer()
+
+        # Take the next free slot, so zones coming back together don't all send at once
+        data = self.hass.data.setdefault(DOMAIN, {})
+        start = max(now + RESTORE_DELAY, data.get("restore_next", 0))
+        data["restore_next"] = start + RESTORE_STAGGER
+        self._unsubs.append(async_call_later(self.hass, start - now, self._async_reassert))
+
+    async def _async_reassert(self, _now=None) -> None:
+        """Drive the members to the restored state, unless the zone has been commanded since"""
+        if not self._is_on or self._commanded_since_restore:
+            return
+        kwargs = {"brightness": self._brightness, "source": "Restore"}
+        if self._curr_effect in (self._effect_list or ()):
+            kwargs[ATTR_EFFECT] = self._curr_effect
+        await self._setDesired(self.async_turn_on, **kwargs)
+
+    async def _async_mqtt_subscribe(self, topic, msg_callback):
+        """Subscribe through the shared MQTT hub when enabled and it covers 'topic', else directly"""
+        if self.mqtt_hub and getMqttHub(self.hass).covers(topic):
+            return await getMqttHub(self.hass).async_subscribe(topic, msg_callback)
+        return await mqtt.async_subscribe(self.hass, topic, msg_callback)
+
     async def async_will_remove_from_hass(self) -> None:
         """Drain subscriptions registered in async_added_to_hass."""
+        if self._motion_timer is not None:
+            self._motion_timer.cancel()
+            self._motion_timer = None
+        if self._reconciler is not None:
+            self._reconciler.cancel()
+        registry = getRegistry(self.hass)
+        for ent_obj in self._allRightLights():
+            registry.release(ent_obj._entity)
+        for ent in self._scene_targets:
+            registry.release(ent)
+        self._scene_targets.clear()
         while self._unsubs:
             unsub = self._unsubs.pop()
             try:
@@ -505,36 +631,33 @@ class NewZoneLight(LightEntity):
         self._max_color_temp_kelvin = attrs.get(ATTR_MAX_COLOR_TEMP_KELVIN, self._max_color_temp_kelvin)
         self.async_write_ha_state()
 
-    async def _async_reload_button_map(self, _now=None) -> None:
-        """Reload the JSON button map if its mtime has advanced."""
-        if not os.path.exists(self._button_map_file):
-            return
-        ts = os.path.getmtime(self._button_map_file)
-        if ts <= self._button_map_timestamp:
+    @callback
+    def _button_map_loaded(self, compiled) -> None:
+        """Make a newly compiled button map live, restarting the press counts"""
+        _LOGGER.debug(f"{self.name} button map loaded: {list(compiled)}")
+        self._button_map = compiled
+        self.clearButtonCounts()
+
+    def _armMotionTimer(self) -> None:
+        """Arm the zone's motion timer for the earliest sensor timeout, if any sensor is occupied"""
+        if self._motion_timer is not None or not self._motion_last_seen:
             return
-        _LOGGER.debug(f"{self.name} loading JSON button map file")
-
-        def loadJSON():
-            with open(self._button_map_file) as fh:
-                return json.load(fh)
+        deadline = min(self._motion_last_seen.values()) + self.motion_sensor_timeout
+        self._motion_timer = self.hass.loop.call_at(deadline, self._onMotionTimer)
 
-        loop = asyncio.get_running_loop()
-        self._button_map_data = await loop.run_in_executor(None, loadJSON)
-        self._button_map_timestamp = ts
-    
-    def _cancelSched(self, entity_id: str):
-        _LOGGER.debug(f"{self.name} _cancelSched: {entity_id}")
-        if entity_id in self._currSched and self._currSched[entity_id]:
-            ret = self._currSched[entity_id]
-            if callable(ret):
-                ret()
-            else:
-                ret.cancel()
-            self._currSched[entity_id] = None
-
-    def _addSched(self, entity_id, ret):
-        _LOGGER.debug(f"{self.name} _addSched: {entity_id}")
-        self._currSched[entity_id] = ret
+    @callback
+    def _onMotionTimer(self) -> None:
+        """Expire every sensor whose timeout has passed, then re-arm for the next one"""
+        self._motion_timer = None
+        cutoff = self.hass.loop.time() - self.motion_sensor_timeout
+        expired = [ms for ms, seen in self._motion_last_seen.items() if seen <= cutoff]
+        for ms in expired:
+            del self._motion_last_seen[ms]
+        self._armMotionTimer()
+
+        if expired:
+            _LOGGER.debug(f"{self.name} motion sensor timeouts: {expired}")
+            self.hass.async_create_task(self.motion_sensors_off(expired))
 
     @property
     def should_poll(self) -> bool:
@@ -618,10 +741,164 @@ class NewZoneLight(LightEntity):
         _LOGGER.debug(f"{self.name} effect_list: {self._effect_list}")
         return self._effect_list
 
+    @property
+    def extra_state_attributes(self):
+        """Return diagnostic attributes for this zone"""
+        cache = trip_points.cacheStats()
+        batcher = getBatcher(self.hass)
+        members = self._allRightLights()
+        return {
+            "trip_point_tables": cache["tables"],
+            "trip_point_bytes": cache["bytes"],
+            "light_commands": batcher.commands,
+            "light_service_calls": batcher.calls,
+            "light_commands_dropped": batcher.dropped,
+            "outbound_queue_depth": sum(batcher.queueDepth().values()),
+            "fan_out_ms": self._fan_out_ms,
+            "retries": sum(rl.retry_count for rl in members),
+            "breaker_trips": sum(rl.breaker_trips for rl in members),
+            "open_breakers": [rl._entity for rl in members if rl.breaker_open],
+            "skipped_sends": sum(rl.skipped_sends for rl in members),
+            "refused_commands": sum(rl.refused for rl in members),
+            "shared_lights": getRegistry(self.hass).shared(),
+            "scene_targets": len(self._scene_targets),
+            "button_latency_ms": self._button_latency_ms,
+            "switched_on": self._switched_on,
+            "brightness_override": self._brightness_override,
+            "occupied_sensors": [
+                ms
+                for occupancies in (self._occupancies, self._full_brightness_occupancies)
+                for ms, occupied in occupancies.items()
+                if occupied
+            ],
+            "superseded_targets": self._superseded,
+            "unchanged_member_commands": self._unchanged,
+        }
+
+    def _allRightLights(self):
+        """Return the RightLight objects of every member entity"""
+        all_entities = list(self.entities.values()) + list(self.entities_below_threshold.values()) + list(self.entities_above_threshold.values())
+        return [ent_obj for ent_obj in all_entities if ent_obj is not None]
+
+    async def _async_fan_out(self, label, coros) -> None:
+        """
+        Run member light commands concurrently, and record how long until all their sends had gone out.  The
+        zone's fan_out_limit caps the service calls in flight in the CommandBatcher, so calls for members
+        sending the same data are still merged.
+        """
+        start = time.monotonic()
+        members = self._allRightLights()
+        before = {ent_obj: ent_obj.pendingSend() for ent_obj in members}
+
+        results = await asyncio.gather(*coros, return_exceptions=True)
+        for result in results:
+            if isinstance(result, Exception):
+                _LOGGER.error(f"{self.name} {label} member command failed: {result!r}")
+
+        # RightLight sends go out later from each light's own timer, so wait for them without holding up the zone
+        sends = []
+        for ent_obj in members:
+            sent = ent_obj.pendingSend()
+            if sent is not None and sent is not before[ent_obj]:
+                sends.append(sent)
+        self.hass.async_create_task(self._async_record_fan_out(label, len(results), start, sends))
+
+    async def _async_record_fan_out(self, label, count, start, sends) -> None:
+        if sends:
+            await asyncio.wait(sends)
+        self._fan_out_ms = round((time.monotonic() - start) * 1000, 1)
+        _LOGGER.debug(f"{self.name} {label}: {count} member commands sent in {self._fan_out_ms}ms")
+
+    def _setDesired(self, method, **kwargs):
+        """
+        Make absolute target 'method(**kwargs)' the zone's desired state.  A single reconciler task applies
+        targets in order, and targets still waiting when a newer absolute one arrives are dropped.  Returns a
+        future that completes once this target has been applied or superseded.
+        """
+        for _, _, pending in self._desired:
+            pending.set_result(None)
+            self._superseded += 1
+        self._desired = []
+        return self._queueDesired(method, kwargs)
+
+    def _stepDesired(self, method, **kwargs):
+        """
+        Queue relative step 'method(steps=1, **kwargs)' after the targets still waiting, since each step
+        builds on the one before.  A step following a waiting step of the same method is folded into it.
+        Returns a future that completes once the step has been applied or superseded.
+        """
+        if self._desired and self._desired[-1][0] == method:
+            _, pending_kwargs, future = self._desired[-1]
+            pending_kwargs["steps"] += 1
+            return future
+        return self._queueDesired(method, {**kwargs, "steps": 1})
+
+    def _motionDesired(self):
+        """
+        Queue an evaluation of the zone's occupancy, replacing only motion evaluations still waiting.  It runs
+        after any switch or tracker target still waiting, and reads _switched_on and occupancy when applied,
+        so it can't undo a press that hasn't been applied yet.
+        """
+        waiting = []
+        for target in self._desired:
+            if target[0] == self._async_apply_motion:
+                target[2].set_result(None)
+                self._superseded += 1
+            else:
+                waiting.append(target)
+        self._desired = waiting
+        return self._queueDesired(self._async_apply_motion, {})
+
+    def _queueDesired(self, method, kwargs):
+        self._commanded_since_restore = True
+        future = self.hass.loop.create_future()
+        self._desired.append((method, kwargs, future))
+        if self._reconciler is None:
+            self._reconciler = self.hass.async_create_task(self._async_reconcile())
+        return future
+
+    async def _async_reconcile(self) -> None:
+        """Apply the desired targets in order until none are left"""
+        future = None
+        try:
+            while self._desired:
+                method, kwargs, future = self._desired.pop(0)
+                try:
+                    await method(**kwargs)
+                except Exception as err:  # noqa: BLE001
+                    _LOGGER.error(f"{self.name} applying {method.__name__}({kwargs}) failed: {err!r}")
+                future.set_result(None)
+        finally:
+            self._reconciler = None
+            # On cancellation, release anyone still waiting on the current or pending targets
+            for pending in [future] + [target[2] for target in self._desired]:
+                if pending and not pending.done():
+                    pending.set_result(None)
+            self._desired = []
+
+    def _memberChanged(self, ent, ent_obj, command) -> bool:
+        """
+        Record 'command' as the one to apply to member 'ent'.  Returns False if the member already had it and
+        it is still in effect: a RightLight command still scheduling its transitions, or a one-shot command
+        that wasn't followed by anything else.
+        """
+        if ent_obj.owner != self.name:
+            in_effect = False
+        else:
+            in_effect = ent_obj.active if command[0] == "rl" else not ent_obj.breaker_open
+        if in_effect and self._applied.get(ent) == command:
+            self._unchanged += 1
+            return False
+        self._applied[ent] = command
+        return True
+
     async def async_turn_on(self, **kwargs) -> None:
         """Instruct the light to turn on."""
         _LOGGER.debug(f"{self.name} LIGHT ASYNC_TURN_ON: {kwargs}")
 
+        if kwargs.get("source") != "Restore":
+            self._commanded_since_restore = True
+
         self._is_on = True
         self._mode = "On"
 
@@ -647,11 +924,14 @@ class NewZoneLight(LightEntity):
             _LOGGER.debug( f"{self.name} LIGHT ASYNC_TURN_ON: BT: {self._brightnessBT}, AT: {self._brightnessAT}")
             _LOGGER.debug( f"{self.name} LIGHT ASYNC_TURN_ON: Entities: {self.entities.keys()}")
 
-        # Assume switched on for anything other than motion sensor sources
+        # Assume switched on for anything other than motion sensor sources.  A restore keeps the restored value.
         if "source" in kwargs and kwargs["source"] == "MotionSensor":
-            pass
+            priority = PRIORITY_MOTION
+        elif "source" in kwargs and kwargs["source"] == "Restore":
+            priority = PRIORITY_BACKGROUND
         else:
             self._switched_on = True
+            priority = PRIORITY_INTERACTIVE
 
         # Always assume RightLight is enabled.  Will override based on ATTR_* inputs
         rl = True
@@ -708,12 +988,12 @@ class NewZoneLight(LightEntity):
         # Report out full data details
         _LOGGER.debug(f"{self.name} LIGHT ASYNC_TURN_ON: Data: {data}")
 
-        # Disable RightLight for all entities before turning on this configuration, to ensure 
-        # a clean state and avoid conflicts between RL and specific attribute inputs.  Will re-enable
-        # for entities as needed based on inputs.
-        all_entities = list(self.entities.values()) + list(self.entities_below_threshold.values()) + list(self.entities_above_threshold.values())
-        for ent_obj in all_entities:
-            await ent_obj.disable()
+        # Only members whose command changed are sent anything, and each RightLight command cancels the
+        # member's previous schedule itself.  Unchanged members keep their schedules.
+        specific = ("specific",) + tuple(
+            (k, tuple(v) if isinstance(v, list) else v) for k, v in sorted(data.items()) if k != "transition"
+        )
+        commands = []
 
         # Process non-threshold entities
         for ent in self.entities:
@@ -724,18 +1004,24 @@ class NewZoneLight(LightEntity):
                 else:
                     thisbr = self._brightness
 
+                if not self._memberChanged(ent, self.entities[ent], ("rl", thisbr, self._brightness_override, rlmode)):
+                    continue
                 _LOGGER.debug( f"{self.name} LIGHT ASYNC_TURN_ON: NT RL turning on {ent}")
 
-                await self.entities[ent].turn_on(
+                commands.append(self.entities[ent].turn_on(
                     brightness=thisbr,
                     brightness_override=self._brightness_override,
                     mode=rlmode,
                     transition=data["transition"],
-                )
+                    priority=priority,
+                    zone=self.name,
+                ))
             else:
                 # Use for other modes, like specific color or temperatures
+                if not self._memberChanged(ent, self.entities[ent], specific):
+                    continue
                 _LOGGER.debug( f"{self.name} LIGHT ASYNC_TURN_ON: NT RL_specific turning on {ent}")
-                await self.entities[ent].turn_on_specific(data)
+                commands.append(self.entities[ent].turn_on_specific(data, priority, self.name))
 
 
         # Process below-threshold entities
@@ -747,18 +1033,26 @@ class NewZoneLight(LightEntity):
                 else:
                     thisbr = self._brightnessBT
 
+                if not self._memberChanged(
+                    ent, self.entities_below_threshold[ent], ("rl", thisbr, self._brightness_override, rlmode)
+                ):
+                    continue
                 _LOGGER.debug( f"{self.name} LIGHT ASYNC_TURN_ON: BT RL turning on {ent}")
 
-                await self.entities_below_threshold[ent].turn_on(
+                commands.append(self.entities_below_threshold[ent].turn_on(
                     brightness=thisbr,
                     brightness_override=self._brightness_override,
                     mode=rlmode,
                     transition=data["transition"],
-                )
+                    priority=priority,
+                    zone=self.name,
+                ))
             else:
                 # Use for other modes, like specific color or temperatures
+                if not self._memberChanged(ent, self.entities_below_threshold[ent], specific):
+                    continue
                 _LOGGER.debug( f"{self.name} LIGHT ASYNC_TURN_ON: BT RL_specific turning on {ent}")
-                await self.entities_below_threshold[ent].turn_on_specific(data)
+                commands.append(self.entities_below_threshold[ent].turn_on_specific(data, priority, self.name))
 
         # Process above-threshold entities
         for ent in self.entities_above_threshold:
@@ -766,8 +1060,10 @@ class NewZoneLight(LightEntity):
             if rl:
                 # Turn on next entity using RightLight
                 if self._brightnessAT == 0:
+                    if not self._memberChanged(ent, self.entities_above_threshold[ent], ("off",)):
+                        continue
                     _LOGGER.debug( f"{self.name} LIGHT ASYNC_TURN_ON: AT RL turning off {ent}")
-                    await self.entities_above_threshold[ent].disable_and_turn_off()
+                    commands.append(self.entities_above_threshold[ent].disable_and_turn_off(priority=priority, zone=self.name))
                 else:
                     if ent in self.brightness_multiplier:
                         thisbr = (
@@ -776,17 +1072,27 @@ class NewZoneLight(LightEntity):
                     else:
                         thisbr = self._brightnessAT
 
+                    if not self._memberChanged(
+                        ent, self.entities_above_threshold[ent], ("rl", thisbr, self._brightness_override, rlmode)
+                    ):
+                        continue
                     _LOGGER.debug( f"{self.name} LIGHT ASYNC_TURN_ON: AT RL turning on {ent}")
-                    await self.entities_above_threshold[ent].turn_on(
+                    commands.append(self.entities_above_threshold[ent].turn_on(
                         brightness=thisbr,
                         brightness_override=self._brightness_override,
                         mode=rlmode,
                         transition=data["transition"],
-                    )
+                        priority=priority,
+                        zone=self.name,
+                    ))
             else:
                 # Use for other modes, like specific color or temperatures
+                if not self._memberChanged(ent, self.entities_above_threshold[ent], specific):
+                    continue
                 _LOGGER.debug( f"{self.name} LIGHT ASYNC_TURN_ON: AT RL_specific turning on {ent}")
-                await self.entities_above_threshold[ent].turn_on_specific(data)
+                commands.append(self.entities_above_threshold[ent].turn_on_specific(data, priority, self.name))
+
+        await self._async_fan_out("turn_on", commands)
 
         self.async_write_ha_state()
 
@@ -807,23 +1113,21 @@ class NewZoneLight(LightEntity):
 
     async def async_turn_on_mode(self, **kwargs) -> None:
         """Turn on one of RightLight's color modes"""
+        self._commanded_since_restore = True
         self._mode = kwargs.get("mode", "Vivid")
         self._is_on = True
         self._brightness = 255
         self._switched_on = True
         self._color_mode = ColorMode.RGB
 
-        for ent in self.entities:
-            await self.entities[ent].turn_on(mode=self._mode)
-        for ent in self.entities_below_threshold:
-            await self.entities_below_threshold[ent].turn_on(mode=self._mode)
-        for ent in self.entities_above_threshold:
-            await self.entities_above_threshold[ent].turn_on(mode=self._mode)
+        self._applied.clear()
+        await self._async_fan_out("turn_on_mode", [ent_obj.turn_on(mode=self._mode, zone=self.name) for ent_obj in self._allRightLights()])
 
         self.async_write_ha_state()
 
     async def async_turn_off(self, **kwargs) -> None:
         """Instruct the light to turn off, conditionally."""
+        self._commanded_since_restore = True
         self._occupancy = any(self._occupancies.values())
         self._full_brightness_occupancy = any(self._full_brightness_occupancies.values())
 
@@ -863,19 +1167,24 @@ class NewZoneLight(LightEntity):
         self._mode = "Off"
 
         this_trans = self.default_transition
+        kwargs["priority"] = PRIORITY_INTERACTIVE
+        kwargs["zone"] = self.name
         if "source" in kwargs:
             if kwargs["source"] == "Switch":
                 this_trans = self.switch_transition
             elif kwargs["source"] == "MotionSensor":
                 this_trans = self.motion_sensor_transition
+                kwargs["priority"] = PRIORITY_MOTION
 
         if not "transition" in kwargs:
             kwargs["transition"] = this_trans
 
+        self._applied.clear()
+        commands = []
         for ent in self.entities_above_threshold:
-            await self.entities_above_threshold[ent].disable_and_turn_off(**kwargs)
+            commands.append(self.entities_above_threshold[ent].disable_and_turn_off(**kwargs))
         for ent in self.entities_below_threshold:
-            await self.entities_below_threshold[ent].disable_and_turn_off(**kwargs)
+            commands.append(self.entities_below_threshold[ent].disable_and_turn_off(**kwargs))
         #f, r = self.getEntityNames()
         # Disable other entities before turning off main entity
         #for ent in r:
@@ -883,41 +1192,48 @@ class NewZoneLight(LightEntity):
             _LOGGER.debug(
                 f"{self.name} LIGHT ASYNC_TURN_OFF_HELPER turning off {ent}"
             )
-            await self.entities[ent].disable_and_turn_off(**kwargs)
+            commands.append(self.entities[ent].disable_and_turn_off(**kwargs))
+
+        await self._async_fan_out("turn_off", commands)
         #if self._debug:
         #    _LOGGER.debug(f"{self.name} LIGHT ASYNC_TURN_OFF_HELPER turning off {f}")
         #await self.entities[f].disable_and_turn_off(**kwargs)
 
         self.async_write_ha_state()
 
-    async def up_brightness(self, **kwargs) -> None:
-        """Increase brightness by one step"""
-        if self._brightness == None:
-            self._brightness = self.brightness_step
-        elif self._brightness > (255 - self.brightness_step):
-            self._brightness = 255
-            self._brightness_override = self._brightness_override + self.brightness_step
-        else:
-            self._brightness = self._brightness + self.brightness_step
+    async def up_brightness(self, steps=1, **kwargs) -> None:
+        """Increase brightness by 'steps' steps"""
+        for _ in range(steps):
+            if self._brightness == None:
+                self._brightness = self.brightness_step
+            elif self._brightness > (255 - self.brightness_step):
+                self._brightness = 255
+                self._brightness_override = self._brightness_override + self.brightness_step
+            else:
+                self._brightness = self._brightness + self.brightness_step
 
         await self.async_turn_on(brightness=self._brightness, **kwargs)
 
-    async def down_brightness(self, **kwargs) -> None:
-        """Decrease brightness by one step"""
-        if self._brightness == None:
-            await self.async_turn_off(**kwargs)
-        elif self._brightness_override > 0:
-            self._brightness_override = 0
-            await self.async_turn_on(brightness=self._brightness, **kwargs)
-        elif self._brightness < self.brightness_step:
-            await self.async_turn_off(**kwargs)
-        else:
-            self._brightness = self._brightness - self.brightness_step
-            await self.async_turn_on(brightness=self._brightness, **kwargs)
+    async def down_brightness(self, steps=1, **kwargs) -> None:
+        """Decrease brightness by 'steps' steps, turning off if that goes below the first step"""
+        for _ in range(steps):
+            if self._brightness == None:
+                await self.async_turn_off(**kwargs)
+                return
+            elif self._brightness_override > 0:
+                self._brightness_override = 0
+            elif self._brightness < self.brightness_step:
+                await self.async_turn_off(**kwargs)
+                return
+            else:
+                self._brightness = self._brightness - self.brightness_step
+
+        await self.async_turn_on(brightness=self._brightness, **kwargs)
 
     async def switch_message_received(self, mqttmsg) -> None:
         # async def switch_message_received(self, topic: str, payload: str, qos: int) -> None:
         """A new MQTT message has been received."""
+        pressed = time.monotonic()
         if ":" in self.switch:
             dev = mqttmsg.data.get("device_ieee")
             if dev != self.switch:
@@ -931,90 +1247,68 @@ class NewZoneLight(LightEntity):
         if "release" in payload:
             return
 
-        if ("hold" in payload) and (payload in self._button_map_data):
-            # JSON found for this button press
-            config_list = self._button_map_data[payload]
-            this_list = config_list[self._buttonCounts[payload]]
+        if ("hold" in payload) and (payload in self._button_map):
+            # Button map plan found for this button press
+            plans = self._button_map[payload]
+            plan = plans[self._buttonCounts.get(payload, 0) % len(plans)]
 
             # Increment button count and loop to zero.  Zero out the other buttons' counts
-            self._buttonCounts[payload] += 1
-            if self._buttonCounts[payload] >= len(config_list):
-                self._buttonCounts[payload] = 0
-            for key in self._buttonCounts.keys():
-                if key != payload:
-                    self._buttonCounts[key] = 0
-
-            for command in this_list:
-                self._switched_on = True
-
-                _LOGGER.debug(f"{self.name} JSON Switch command: {command}")
-                if command[0] == "Brightness":
-                    ent = command[1]
-                    br = command[2]
-
-                    if br == 0:
-                        await self.hass.services.async_call(
-                            "light", "turn_off", {"entity_id": ent}
-                        )
-                    else:
-                        await self.hass.services.async_call(
-                            "light", "turn_on", {"entity_id": ent, "brightness": br}
-                        )
-                elif command[0] == "RightLight":
-                    ent = command[1]
-                    val = command[2]
-
-                    if not ent in self.entities:
-                        self.entities[ent] = RightLight(ent, self.hass, self._debug_rl)
-
-                    rl = self.entities[ent]
-
-                    if val == "Disable":
-                        await rl.disable()
-                    elif val in rl.getColorModes():
-                        await rl.turn_on(mode=val)
-                    elif (val == 0) or (val == "Off"):
-                        await rl.disable_and_turn_off()
-                    else:
-                        await rl.turn_on(brightness=val, brightness_override=0)
-                elif command[0] == "Color":
-                    ent = command[1]
-                    r, g, b = command[2:]
-                    br = sum([r, g, b]) / 3
-
-                    if not ent in self.entities:
-                        self.entities[ent] = RightLight(ent, self.hass, self._debug_rl)
-
-                    rl = self.entities[ent]
-                    await rl.turn_on_specific(
-                        {"entity_id": ent, "rgb_color": [r, g, b], "brightness": br}
-                    )
+            count = self._buttonCounts.get(payload, 0) + 1
+            self.clearButtonCounts()
+            self._buttonCounts[payload] = count if count < len(plans) else 0
 
-                elif command[0] == "Scene":
-                    await self.hass.services.async_call(
-                        "scene", "turn_on", {"entity_id": command[1]}
-                    )
-                else:
-                    _LOGGER.error(
-                        f"{self.name} error - unrecognized button_map.json command type: {command[0]}"
-                    )
+            self._switched_on = True
+            self._commanded_since_restore = True
+            for command in plan:
+                _LOGGER.debug(f"{self.name} button map command: {type(command).__name__} {command.entity_id}")
+                # Whatever async_turn_on last sent this entity no longer applies
+                self._applied.pop(command.entity_id, None)
+            sends = await async_runPlan(self, plan)
+            self.hass.async_create_task(self._async_record_button_latency(payload, len(plan), pressed, sends))
 
         elif payload.startswith("on"):  # and "press" in payload:
             self.clearButtonCounts()
             self._brightness_override = 0
-            await self.async_turn_on(source="Switch", brightness=255)
+            await self._setDesired(self.async_turn_on, source="Switch", brightness=255)
         elif payload.startswith("up"):  # and "press" in payload:
             self.clearButtonCounts()
-            await self.up_brightness(source="Switch")
+            await self._stepDesired(self.up_brightness, source="Switch")
         elif payload.startswith("down"):  # and "press" in payload:
             self.clearButtonCounts()
-            await self.down_brightness(source="Switch")
+            await self._stepDesired(self.down_brightness, source="Switch")
         elif payload.startswith("off"):  # and "press" in payload:
             self.clearButtonCounts()
-            await self.async_turn_off(source="Switch")
+            await self._setDesired(self.async_turn_off, source="Switch")
         else:
             _LOGGER.debug(f"{self.name} switch handler fail: {payload}")
 
+    async def _async_record_button_latency(self, payload, count, pressed, sends) -> None:
+        """Record the latency of a button press once the RightLight sends its plan left pending have gone out"""
+        if sends:
+            await asyncio.wait(sends)
+        self._button_latency_ms[payload] = round((time.monotonic() - pressed) * 1000, 1)
+        _LOGGER.debug(f"{self.name} {payload}: {count} commands sent in {self._button_latency_ms[payload]}ms")
+
+    def _sceneTarget(self, ent):
+        """
+        Return the RightLight for button-map target 'ent'.  Targets outside the zone's members are kept apart,
+        so zone-wide commands don't drive them, and only the most recently used scene_target_limit are held.
+        """
+        for members in (self.entities, self.entities_below_threshold, self.entities_above_threshold):
+            if members.get(ent) is not None:
+                return members[ent]
+
+        registry = getRegistry(self.hass)
+        rl = self._scene_targets.pop(ent, None)
+        if rl is None:
+            rl = registry.acquire(ent, self._debug_rl)
+            while len(self._scene_targets) >= self.scene_target_limit:
+                oldest = next(iter(self._scene_targets))
+                del self._scene_targets[oldest]
+                registry.release(oldest)
+        self._scene_targets[ent] = rl
+        return rl
+
     def clearButtonCounts(self):
         for key in self._buttonCounts.keys():
             self._buttonCounts[key] = 0
@@ -1039,66 +1333,59 @@ class NewZoneLight(LightEntity):
             _LOGGER.error(f"{self.name}: Unexpected motion sensor name: {entity_id}")
             return
 
-        # Schedule motion_sensor_off call after timeout
-        self._cancelSched(entity_id)
-        #ret = async_call_later(self.hass, self.motion_sensor_timeout, lambda _: self.motion_sensor_off(entity_id))
-        def schedule_motion_sensor_off(hass, now=None):
-            _LOGGER.debug(f"{self.name} scheduling motion sensor off: {entity_id}")
-            self.hass.create_task(self.motion_sensor_off(entity_id))
-
-        _LOGGER.debug(f"{self.name} scheduling motion sensor off in {self.motion_sensor_timeout} seconds")
-        ret = async_call_later(self.hass, self.motion_sensor_timeout, schedule_motion_sensor_off)
-        _LOGGER.debug(f"{self.name} scheduling complete")
-        self._addSched(entity_id, ret)
+        # Push back this sensor's timeout.  The zone timer re-arms itself from the earliest deadline when
+        # it fires, so a repeat report only updates the timestamp.
+        self._motion_last_seen[entity_id] = self.hass.loop.time()
+        self._armMotionTimer()
 
         if delta_found:
             await self.handle_motion_sensor_state()
 
-    async def motion_sensor_off(self, entity_id: str) -> None:
-        """Set motion sensor to 'off' state"""
-        _LOGGER.debug(f"{self.name} motion sensor off: {entity_id}")
+    async def motion_sensors_off(self, entity_ids) -> None:
+        """Set motion sensors to 'off' state, re-evaluating the zone once for the whole batch"""
+        _LOGGER.debug(f"{self.name} motion sensors off: {entity_ids}")
 
-        if entity_id in self._occupancies:
-            self._occupancies[entity_id] = False
-            self._occupancy = any(self._occupancies.values())
-        elif entity_id in self._full_brightness_occupancies:
-            self._full_brightness_occupancies[entity_id] = False
-            self._full_brightness_occupancy = any(self._full_brightness_occupancies.values())
-        else:
-            _LOGGER.error(f"{self.name}: Unexpected motion sensor name: {entity_id}")
-            return
+        for entity_id in entity_ids:
+            if entity_id in self._occupancies:
+                self._occupancies[entity_id] = False
+            elif entity_id in self._full_brightness_occupancies:
+                self._full_brightness_occupancies[entity_id] = False
+            else:
+                _LOGGER.error(f"{self.name}: Unexpected motion sensor name: {entity_id}")
+        self._occupancy = any(self._occupancies.values())
+        self._full_brightness_occupancy = any(self._full_brightness_occupancies.values())
 
         await self.handle_motion_sensor_state()
     
     async def handle_motion_sensor_state(self) -> None:
         """Handle motion sensor state changes"""
-        # Schedule motion_sensor_off call after timeout
-        #self._cancelSched()
+        if self._switched_on:
+            return
+
+        self._motionDesired()
 
+    async def _async_apply_motion(self) -> None:
+        """Drive the zone from its occupancy, as it stands when the reconciler gets to it"""
         if self._switched_on:
             return
 
         if self._full_brightness_occupancy and not any(self.motion_disable_trackers.values()):
-            self.hass.async_create_task(self.async_turn_on(brightness=255, source="MotionSensor"))
+            await self.async_turn_on(brightness=255, source="MotionSensor")
         elif self._occupancy and not any(self.motion_disable_trackers.values()):
-            self.hass.async_create_task(self.async_turn_on(brightness=self.motion_sensor_brightness, source="MotionSensor"))
+            await self.async_turn_on(brightness=self.motion_sensor_brightness, source="MotionSensor")
         else:
-            self.hass.async_create_task(self.async_turn_off(source="MotionSensor"))
+            await self.async_turn_off(source="MotionSensor")
 
-    async def motion_sensor_message_received(self, mqttmsg) -> None:
-        """A new MQTT message has been received."""
-        # async def motion_sensor_message_received( self, topic: str, payload: str, qos: int) -> None:
-        topic, payload, qos = mqttmsg.topic, mqttmsg.payload, mqttmsg.qos
-
-        payload = json.loads(payload)
-        z, ms = topic.split("/")
-        _LOGGER.debug(f"{self.name} motion sensor: {topic}, {payload}, {qos}")
+    async def motion_sensor_message_received(self, ev) -> None:
+        """A decoded MotionEvent has been delivered by the MotionSensorHub."""
+        ms = ev.sensor
+        _LOGGER.debug(f"{self.name} motion sensor: {ev}")
 
         if not ms in self._occupancies and not ms in self._full_brightness_occupancies:
             _LOGGER.error(f"{self.name}: Unexpected motion sensor name: {ms}")
             return
 
-        if payload['occupancy'] == "on" or payload['occupancy'] == True:
+        if ev.occupancy:
             await self.motion_sensor_on(ms)
 
     async def motion_sensor_message_received_zha(self, ev) -> None:
@@ -1156,7 +1443,7 @@ class NewZoneLight(LightEntity):
             ## Turn on if not already on or new other light is brighter
             # if (self._is_on == False) or (self._brightness < this_br):
             #    await self.async_turn_on(brightness=this_br)
-            await self.async_turn_on(brightness=this_br)
+            await self._setDesired(self.async_turn_on, brightness=this_br)
 
             # Feature to turn off other lights when this light goes on
             if self.turn_off_other_lights:
@@ -1167,4 +1454,4 @@ class NewZoneLight(LightEntity):
             self._others[ent] = False
 
             if not any(self._others.values()):
-                await self.async_turn_off()
+                await self._setDesired(self.async_turn_off)
@@ -0,0 +1,313 @@
+"""Outbound service calls for RightLight, merged into multi-entity calls when their data matches"""
+from collections import deque
+from homeassistant.core import HomeAssistant
+import asyncio, logging
+
+from .const import DOMAIN
+
+_LOGGER = logging.getLogger(__name__)
+
+# Priority classes, most urgent first.  Switch presses and GUI changes are interactive, occupancy changes
+# are motion, and circadian transitions, color cycling and validation retries are background.
+PRIORITY_INTERACTIVE = 0
+PRIORITY_MOTION = 1
+PRIORITY_BACKGROUND = 2
+
+
+class _Batch:
+    """Service calls waiting for the next flush that only differ in entity_id"""
+
+    __slots__ = ("domain", "service", "data", "blocking", "priority", "zone", "entity_ids", "future", "partial")
+
+    def __init__(self, domain, service, data, blocking, priority, zone, future, partial=False) -> None:
+        self.domain = domain
+        self.service = service
+        self.data = data
+        self.blocking = blocking
+        self.priority = priority
+        self.zone = zone
+        self.entity_ids = {}
+        self.future = future
+        self.partial = partial
+        """True for a part split off ahead of the rest, which leaves the shared future to the last part"""
+
+    def split(self, count):
+        """Move the first 'count' entities into a new batch, to be sent ahead of the ones left in this one"""
+        part = _Batch(
+            self.domain, self.service, self.data, self.blocking, self.priority, self.zone, self.future, True
+        )
+        for ent in list(self.entity_ids)[:count]:
+            del self.entity_ids[ent]
+            part.entity_ids[ent] = None
+        return part
+
+
+class _TokenBucket:
+    """Allows 'rate' units per second with bursts of up to 'rate', or anything when 'rate' is None"""
+
+    __slots__ = ("rate", "tokens", "stamp")
+
+    def __init__(self, rate) -> None:
+        self.rate = rate
+        self.tokens = rate
+        self.stamp = None
+
+    def ready(self, now) -> bool:
+        """Return True if at least one unit may be spent now"""
+        if self.rate is None:
+            return True
+        if self.stamp is not None:
+            self.tokens = min(self.rate, self.tokens + (now - self.stamp) * self.rate)
+        self.stamp = now
+        return self.tokens >= 1
+
+    def available(self):
+        """Whole units that may be spent without going into debt, as of the last ready(), or None for no limit"""
+        return None if self.rate is None else int(self.tokens)
+
+    def spend(self, units) -> None:
+        """Use up 'units', going into debt if a single spend is larger than what is left"""
+        if self.rate is not None:
+            self.tokens -= units
+
+    def wait(self):
+        """Seconds until the next unit may be spent"""
+        return (1 - self.tokens) / self.rate
+
+
+_NOT_READY = object()
+
+
+class _Lane:
+    """Batches of one priority class, queued per zone and released round robin, at most 'rate' calls per second"""
+
+    __slots__ = ("bucket", "zones", "depth")
+
+    def __init__(self, rate) -> None:
+        self.bucket = _TokenBucket(rate)
+        self.zones = {}
+        """Insertion-ordered dictionary of zone to deque of queued batches"""
+        self.depth = 0
+        """Number of queued batches"""
+
+    def push(self, batch) -> None:
+        self.zones.setdefault(batch.zone, deque()).append(batch)
+        self.depth += 1
+
+    def pushFront(self, batch) -> None:
+        """Queue 'batch' ahead of its zone's other batches, for the rest of a batch sent in parts"""
+        self.zones.setdefault(batch.zone, deque()).appendleft(batch)
+        self.depth += 1
+
+    def pop(self, ready):
+        """
+        Return the oldest batch of the first zone in turn for which 'ready(zone)' is true, and move that zone to
+        the back.  Returns None if no zone is ready.
+        """
+        zone = next((zone for zone in self.zones if ready(zone)), _NOT_READY)
+        if zone is _NOT_READY:
+            return None
+        queue = self.zones.pop(zone)
+        batch = queue.popleft()
+        if queue:
+            self.zones[zone] = queue
+        self.depth -= 1
+        return batch
+
+
+class CommandBatcher:
+    """
+    Collects service calls made during one event loop iteration and sends each distinct
+    (domain, service, data) once, with the list of all entity_ids that asked for it.  Merged calls are
+    released most urgent priority class first, with motion and background classes rate limited so they
+    never hold up an interactive call.  A global limit on per-entity commands protects the Zigbee mesh,
+    zones take turns within each class, and a zone may cap how many of its calls are in flight at once.  An unsent command for an entity is dropped once a newer command for
+    it arrives, whatever either one's class, so commands for one entity never go out of order.
+    """
+
+    lane_rates = {
+        PRIORITY_INTERACTIVE: None,
+        PRIORITY_MOTION: 20,
+        PRIORITY_BACKGROUND: 5,
+    }
+    """Calls per second allowed for each priority class, or None for no limit"""
+
+    rate_limit = 25
+    """
+    Per-entity commands per second allowed across all classes, or None for no limit.  Interactive calls
+    never wait for it but are counted against it, so the other classes back off after a burst of presses.
+    The other classes never go into debt: a call for more entities than the limit allows is sent in parts.
+    """
+
+    def __init__(self, hass: HomeAssistant) -> None:
+        self._hass = hass
+        self._pending = {}
+        """Dictionary of frozen call key to _Batch, for calls not yet sent"""
+        self._lanes = [_Lane(self.lane_rates[p]) for p in sorted(self.lane_rates)]
+        """Per priority class queues of merged calls waiting for their rate limit"""
+        self._bucket = _TokenBucket(self.rate_limit)
+        """Global limit on per-entity commands"""
+        self._queued = {}
+        """Dictionary of entity_id to the unsent batch holding its most recent command"""
+        self._zone_limits = {}
+        """Dictionary of zone to the most service calls it may have in flight at once"""
+        self._in_flight = {}
+        """Dictionary of zone to its number of service calls in flight"""
+        self._drain_timer = None
+        self.commands = 0
+        """Number of per-entity commands requested"""
+        self.calls = 0
+        """Number of service calls actually made"""
+        self.dropped = 0
+        """Number of unsent commands replaced by a newer command for the same entity"""
+
+    def setRateLimit(self, rate) -> None:
+        """Change the global per-entity command rate, or remove the limit with None"""
+        self.rate_limit = rate
+        self._bucket = _TokenBucket(rate)
+
+    def setZoneLimit(self, zone, limit) -> None:
+        """Allow 'zone' at most 'limit' service calls in flight at once, or any number with None"""
+        self._zone_limits[zone] = limit
+
+    def _zoneReady(self, zone) -> bool:
+        limit = self._zone_limits.get(zone)
+        return limit is None or self._in_flight.get(zone, 0) < limit
+
+    def queueDepth(self):
+        """Return the number of merged calls waiting in each priority class"""
+        return {priority: lane.depth for priority, lane in enumerate(self._lanes)}
+
+    async def async_call(
+        self, domain, service, data, blocking=False, priority=PRIORITY_INTERACTIVE, zone=None
+    ) -> None:
+        """
+        Queue a call for 'data["entity_id"]' and wait until the merged call has been made, or dropped for a
+        newer command to the same entity
+
+        :param zone: Name of the requesting zone, for fair sharing of the rate limits between zones
+        """
+        data = dict(data)
+        entity_ids = data.pop("entity_id")
+        if isinstance(entity_ids, str):
+            entity_ids = [entity_ids]
+
+        key = (domain, service, blocking, _freeze(data))
+        batch = self._pending.get(key)
+        if batch is None:
+            if not self._pending:
+                self._hass.loop.call_soon(self._flush)
+            batch = _Batch(domain, service, data, blocking, priority, zone, self._hass.loop.create_future())
+            self._pending[key] = batch
+        else:
+            # A merged call goes out with its most urgent requester
+            batch.priority = min(batch.priority, priority)
+
+        for ent in entity_ids:
+            if self._queued.get(ent) is not batch:
+                self._dropQueued(ent)
+                self._queued[ent] = batch
+            batch.entity_ids[ent] = None
+        self.commands += len(entity_ids)
+
+        # Shielded, so a requester being cancelled doesn't cancel the call for everyone else merged into it
+        await asyncio.shield(batch.future)
+
+    def _flush(self) -> None:
+        pending = self._pending
+        self._pending = {}
+        for batch in pending.values():
+            if batch.entity_ids:
+                self._lanes[batch.priority].push(batch)
+        self._drain()
+
+    def _dropQueued(self, ent) -> None:
+        """Remove 'ent' from its unsent batch, pending or queued in any lane, since a newer command supersedes it"""
+        batch = self._queued.pop(ent, None)
+        if batch is None:
+            return
+        del batch.entity_ids[ent]
+        self.dropped += 1
+        if not batch.entity_ids and not batch.future.done():
+            # Not queued, or left in its lane and skipped when it comes up, but nobody needs to wait for it
+            batch.future.set_result(None)
+
+    def _drain(self) -> None:
+        """Send what each lane's rate allows, most urgent first, and wake up again for the rest"""
+        if self._drain_timer is not None:
+            self._drain_timer.cancel()
+            self._drain_timer = None
+
+        now = self._hass.loop.time()
+        wait = None
+        for priority, lane in enumerate(self._lanes):
+            exempt = priority == PRIORITY_INTERACTIVE
+            capped = False
+            while lane.depth and lane.bucket.ready(now) and (exempt or self._bucket.ready(now)):
+                queued = lane.pop(self._zoneReady)
+                if queued is None:
+                    # Every zone with calls waiting is at its cap, and the next call to finish drains again
+                    capped = True
+                    break
+                if not queued.entity_ids:
+                    continue
+
+                batch = queued
+                budget = None if exempt else self._bucket.available()
+                if budget is not None and len(queued.entity_ids) > budget:
+                    # Send what the global limit allows now, and the rest ahead of this zone's later calls
+                    batch = queued.split(budget)
+                    lane.pushFront(queued)
+
+                for ent in batch.entity_ids:
+                    if self._queued.get(ent) is queued:
+                        del self._queued[ent]
+                lane.bucket.spend(1)
+                self._bucket.spend(len(batch.entity_ids))
+                self._in_flight[batch.zone] = self._in_flight.get(batch.zone, 0) + 1
+                self._hass.async_create_task(self._async_send(batch))
+
+            if lane.depth and not capped:
+                # Held back by either the global limit or this class's own
+                lane_wait = lane.bucket.wait() if self._bucket.ready(now) else self._bucket.wait()
+                wait = lane_wait if wait is None else min(wait, lane_wait)
+
+        if wait is not None:
+            self._drain_timer = self._hass.loop.call_later(wait, self._drain)
+
+    async def _async_send(self, batch) -> None:
+        entity_ids = list(batch.entity_ids)
+        data = dict(batch.data)
+        data["entity_id"] = entity_ids[0] if len(entity_ids) == 1 else entity_ids
+
+        _LOGGER.debug(f"{batch.domain}.{batch.service}: {data}")
+        self.calls += 1
+        try:
+            await self._hass.services.async_call(batch.domain, batch.service, data, blocking=batch.blocking)
+        except Exception as err:  # noqa: BLE001
+            if not batch.future.done():
+                batch.future.set_exception(err)
+        else:
+            if not batch.partial and not batch.future.done():
+                batch.future.set_result(None)
+        finally:
+            self._in_flight[batch.zone] -= 1
+            if batch.zone in self._zone_limits and any(lane.depth for lane in self._lanes):
+                self._drain()
+
+
+def _freeze(value):
+    """Return a hashable copy of a service data value"""
+    if isinstance(value, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+
+def getBatcher(hass: HomeAssistant) -> CommandBatcher:
+    """Return the integration-wide CommandBatcher, creating it on first use"""
+    data = hass.data.setdefault(DOMAIN, {})
+    if "batcher" not in data:
+        data["batcher"] = CommandBatcher(hass)
+    return data["batcher"]
@@ -0,0 +1,59 @@
+"""Integration-wide RightLight objects, one per light entity however many zones and button maps use it"""
+from homeassistant.core import HomeAssistant
+import logging
+
+from .const import DOMAIN
+from .right_light import RightLight
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class RightLightRegistry:
+    """
+    Hands out one reference-counted RightLight per entity_id, so a light in several zones has a single
+    scheduler.  Zones sharing a light are arbitrated by RightLight itself, on each command's priority.
+    A shared light logs in debug mode if any of its holders asked for it.
+    """
+
+    def __init__(self, hass: HomeAssistant) -> None:
+        self._hass = hass
+        self._lights = {}
+        """Dictionary of entity_id to RightLight"""
+        self._refs = {}
+        """Dictionary of entity_id to number of holders"""
+
+    def acquire(self, entity_id, debug=False) -> RightLight:
+        """Return the RightLight for 'entity_id', creating it on first use.  Pair with release()."""
+        rl = self._lights.get(entity_id)
+        if rl is None:
+            rl = RightLight(entity_id, self._hass, debug)
+            self._lights[entity_id] = rl
+            self._refs[entity_id] = 0
+        elif debug:
+            rl._debug = True
+        self._refs[entity_id] += 1
+        return rl
+
+    def release(self, entity_id) -> None:
+        """Drop one hold on 'entity_id', stopping and forgetting its RightLight when none are left"""
+        if entity_id not in self._refs:
+            return
+        self._refs[entity_id] -= 1
+        if self._refs[entity_id] > 0:
+            return
+        del self._refs[entity_id]
+        rl = self._lights.pop(entity_id)
+        rl.async_teardown()
+        _LOGGER.debug(f"Released last hold on {entity_id}")
+
+    def shared(self):
+        """Return the number of lights held more than once"""
+        return sum(1 for refs in self._refs.values() if refs > 1)
+
+
+def getRegistry(hass: HomeAssistant) -> RightLightRegistry:
+    """Return the integration-wide RightLightRegistry, creating it on first use"""
+    data = hass.data.setdefault(DOMAIN, {})
+    if "registry" not in data:
+        data["registry"] = RightLightRegistry(hass)
+    return data["registry"]
@@ -1,10 +1,24 @@
 from homeassistant.helpers import entity
-from homeassistant.helpers.event import async_call_later
+from homeassistant.helpers.event import async_call_later, async_track_state_change_event
 from homeassistant.core import HomeAssistant, callback
 from homeassistant.util import dt
 import logging, random, asyncio
-from suntime import Sun
-from datetime import date, timedelta
+from enum import Enum
+
+from .cycle_ticker import getTicker
+from .outbound import getBatcher, PRIORITY_BACKGROUND, PRIORITY_INTERACTIVE
+from .sun_times import getSunTimes
+from .trip_points import getTripPoints
+
+
+class _Action(Enum):
+    """Pending scheduler action of a RightLight"""
+    NONE = 0
+    SEND_NOW = 1  # Send the target for the current time
+    SEND_NEXT = 2  # Start the transition to the next trip point
+    VALIDATE = 3  # Re-run turn_on in validation mode
+    RESTART = 4  # Re-run turn_on at the next trip point
+    VALIDATE_OFF = 5  # Re-run disable_and_turn_off in validation mode
 
 
 class RightLight:
@@ -15,6 +29,9 @@ class RightLight:
     validate_color_threshold = 30  # Color difference to consider a change valid (per RGB channel)
     trans_delay_min = 5  # Minimum seconds for a transition
     trans_delay_max = 15  # Maximum seconds for a transition
+    retry_max_attempts = 6  # Failed validations in a row before the circuit breaker opens
+    retry_max_delay = 300  # Maximum seconds between retries
+    retry_jitter_max = 5  # Maximum random seconds added to each retry delay
 
     def __init__(self, ent: entity, hass: HomeAssistant, debug=False) -> None:
         self._entity = ent
@@ -27,7 +44,7 @@ class RightLight:
         self._logger = logging.getLogger(f"RightLight({self._entity})")
 
 
-        self.trip_points = {}
+        self._trip_table = None
 
         state = self._hass.states.get(self._entity)
         self._ct_high = 5000
@@ -42,22 +59,70 @@ class RightLight:
         self.off_transition = 0.2
         self.dim_transition = 0.2
 
-        # Store callback for cancelling scheduled next event
-        self._currSched = []
+        # Scheduler state: one timer running 'action' at 'deadline', then 'next_action' at 'next_deadline'
+        self._timer = None
+        self._deadline = None
+        self._action = _Action.NONE
+        self._next_action = _Action.NONE
+        self._next_deadline = None
+        self._after_send = None  # (action, delay, future) to schedule and resolve once SEND_NOW has gone out
+
+        # Service data for the pending sends
+        self._now_service = "turn_on"
+        self._now_data = None
+        self._next_data = None
+        self._next_time = None
+        self._priority = PRIORITY_INTERACTIVE  # Outbound priority class of the SEND_NOW target
+
+        # Zone whose command this light is following, and that command's priority class.  Zones sharing the
+        # light through the registry are arbitrated on these.
+        self._zone = None
+        self._owner_priority = PRIORITY_BACKGROUND
+        self.refused = 0
+
+        # State-change subscription used to validate as soon as the entity reports the target
+        self._unsub_state = None
+        self._watch_check = None
+        self._watch_action = _Action.NONE
+
+        # Retry/circuit breaker state for failed validations
+        self._retries = 0
+        self.retry_count = 0
+        self.breaker_open = False
+        self.breaker_trips = 0
+
+        # Sends skipped because the entity already showed the target
+        self.skipped_sends = 0
+
+        # Service calls are merged with other RightLights sending the same data in the same loop iteration
+        self._outbound = getBatcher(self._hass)
+
+        # Color cycling modes are advanced by a shared timer per mode, while this is the subscribed mode
+        self._ticker = getTicker(self._hass)
+        self._ticker_mode = None
 
         cd = self._hass.config.as_dict()
-        self.sun = Sun(cd["latitude"], cd["longitude"])
+        self._latitude = cd["latitude"]
+        self._longitude = cd["longitude"]
 
         self._getNow()
 
-        async def updateMaxMin(_):
+        @callback
+        def updateMaxMin(_=None):
             state = self._hass.states.get(self._entity)
+            if state is None:
+                return
             self._ct_max = state.attributes.get("max_color_temp_kelvin", self._ct_max)
             self._ct_min = state.attributes.get("min_color_temp_kelvin", self._ct_min)
             if self._debug:
                 self._logger.error(f"updateMaxMin: {self._ct_min}, {self._ct_max}")
 
-        async_call_later(self._hass, 10, updateMaxMin)
+        # Read the limits now if the entity already has a state, so a restored schedule starts with them
+        self._unsub_max_min = None
+        if state is not None:
+            updateMaxMin()
+        else:
+            self._unsub_max_min = async_call_later(self._hass, 10, updateMaxMin)
 
     async def turn_on(self, **kwargs) -> None:
         """
@@ -70,7 +135,12 @@ class RightLight:
         :key valmode: If True, verify that the lights turned on, then start the next transition.
                       If False, schedule the first transition and a later turn_on with valmode=True
         :key nocancel: If True, do not cancel any pending scheduled events. Used when scheduling a new turn_on
+        :key priority: Outbound priority class of the first send.  Validation re-sends are always background.
+        :key zone: Name of the commanding zone.  Omitted by RightLight's own follow-up calls.
         """
+        if "zone" in kwargs and not self._claim(kwargs["zone"], kwargs.get("priority", PRIORITY_INTERACTIVE)):
+            return
+
         # Cancel any pending eventloop schedules
         nocancel = kwargs.get("nocancel", False)
         if not nocancel:
@@ -83,6 +153,9 @@ class RightLight:
         self._brightness_override = kwargs.get("brightness_override", 0)
         this_transition = kwargs.get("transition", self.on_transition)
         this_valmode = kwargs.get("valmode", False)
+        if not this_valmode:
+            self._resetRetries()
+        self._priority = PRIORITY_BACKGROUND if this_valmode else kwargs.get("priority", PRIORITY_INTERACTIVE)
 
         if self._debug:
             self._logger.error(f"RightLight turn_on: {kwargs}")
@@ -96,37 +169,32 @@ class RightLight:
             return
 
         # Find trip points around current time
-        for next_idx in range(0, len(self.trip_points[self._mode])):
-            if self.trip_points[self._mode][next_idx][0] >= self.now:
-                break
-        prev_idx = next_idx - 1
+        prev_time, next_time, prev_vals, next_vals = self._trip_table.lookup(self._mode, self.now)
 
         # Calculate how far through the trip point span we are now
-        prev_time = self.trip_points[self._mode][prev_idx][0]
-        next_time = self.trip_points[self._mode][next_idx][0]
         time_ratio = (self.now - prev_time) / (next_time - prev_time)
         time_rem = (next_time - self.now).seconds
 
         if self._debug:
             self._logger.error(f"Now: {self.now}")
             self._logger.error(
-                f"Prev/Next: {prev_idx}, {next_idx}, {prev_time}, {next_time}, {time_ratio}"
+                f"Prev/Next: {prev_time}, {next_time}, {time_ratio}"
             )
 
         if self._mode == "Normal":
             # Compute br/ct for previous point
-            br_max_prev = self.trip_points["Normal"][prev_idx][1][1] / 255
+            br_max_prev = prev_vals[1] / 255
             br_prev = br_max_prev * (self._brightness + self._brightness_override)
 
-            ct_max_prev = self.trip_points["Normal"][prev_idx][1][0]
+            ct_max_prev = prev_vals[0]
             ct_delta_prev = (self._ct_high - ct_max_prev) * (1 - br_max_prev) * self._ct_scalar
             ct_prev = ct_max_prev - ct_delta_prev
 
             # Compute br/ct for next point
-            br_max_next = self.trip_points["Normal"][next_idx][1][1] / 255
+            br_max_next = next_vals[1] / 255
             br_next = br_max_next * (self._brightness + self._brightness_override)
 
-            ct_max_next = self.trip_points["Normal"][next_idx][1][0]
+            ct_max_next = next_vals[0]
             ct_delta_next = (self._ct_high - ct_max_next) * (1 - br_max_next) * self._ct_scalar
             #self._logger.error(f"ct_max_next: {ct_max_next}, ct_delta_next: {ct_delta_next}, br_max_next: {br_max_next}")
             #self._logger.error(f"ct_high: {self._ct_high}, ct_scalar: {self._ct_scalar}")
@@ -168,160 +236,26 @@ class RightLight:
             if self._debug:
                 self._logger.error(f"Final: {br}/{ct} -> {time_rem}sec")
 
-            async def turn_on_now(_):
-                if self._debug:
-                    self._logger.error(f"turn_on_now start.  br/ct: {br}/{ct}, transition: {this_transition}")
-                await self._hass.services.async_call(
-                    "light",
-                    "turn_on",
-                    {
-                        "entity_id": self._entity,
-                        "brightness": br,
-                        "color_temp_kelvin": ct,
-                        "transition": this_transition,
-                    },
-                    blocking=True,
-                )
-                if self._debug:
-                    self._logger.error(f"turn_on_now done")
-
-            #async def turn_on_now(_):
-            #    state = self._hass.states.get(self._entity)
-            #    bulb_was_off = state is None or state.state != "on"
-            #    if bulb_was_off:
-            #        await self._hass.services.async_call(
-            #            "light", "turn_on",
-            #            {"entity_id": self._entity},
-            #            blocking=True,
-            #        )
-            #        await asyncio.sleep(0.1)
-            #    await self._hass.services.async_call(
-            #        "light", "turn_on",
-            #        {
-            #            "entity_id": self._entity,
-            #            "brightness": br,
-            #            "color_temp_kelvin": ct,
-            #            "transition": this_transition,
-            #        },
-            #        blocking=True,
-            #    )
-
-            async def turn_on_next(_):
-                if self._debug:
-                    self._logger.error(f"turn_on_next start.  br/ct: {br_next}/{ct_next}, transition: {time_rem}")
-                remaining = max(0, int(round((next_time - dt.now()).total_seconds())))
-                await self._hass.services.async_call(
-                    "light",
-                    "turn_on",
-                    {
-                        "entity_id": self._entity,
-                        "brightness": br_next,
-                        "color_temp_kelvin": ct_next,
-                        "transition": remaining,
-                    },
-                    blocking=True,
-                )
-                if self._debug:
-                    self._logger.error(f"turn_on_next done")
-
-            async def reschedule_turn_on(_):
-                if self._debug:
-                    self._logger.error(f"reschedule_turn_on start")
-                await self.turn_on(
-                    brightness=self._brightness,
-                    brightness_override=self._brightness_override,
-                    mode=self._mode,
-                    valmode=True,
-                    nocancel=False,
-                )
-                if self._debug:
-                    self._logger.error(f"reschedule_turn_on done")
-
-            async def schedule_next_turn_on(_):
-                if self._debug:
-                    self._logger.error(f"schedule_next_turn_on start")
-                await self.turn_on(
-                    brightness=self._brightness,
-                    brightness_override=self._brightness_override,
-                    mode=self._mode,
-                    valmode=False,
-                    nocancel=False,
-                )
-                if self._debug:
-                    self._logger.error(f"schedule_next_turn_on done")
-
-            if this_valmode:
-                # In validation mode, verify the entity is on and at the correct brightness and color temp
-                # If it's on, schedule the next transitions
-                # If it's not, turn it on again and schedule another validation
-
-                # Verify current state against intended state
-                state = self._hass.states.get(self._entity)
-                state_is_correct = (state is not None and state.state == "on")
-                if state_is_correct:
-                    br_is_correct = abs(state.attributes.get("brightness", -1) - br) < RightLight.validate_brightness_threshold
-                    ct_is_correct = abs(state.attributes.get("color_temp_kelvin", -1) - ct) < RightLight.validate_ct_threshold
-                else:
-                    br_is_correct = False
-                    ct_is_correct = False
-                is_correct = state_is_correct and br_is_correct and ct_is_correct
-
-                if self._debug:
-                    self._logger.error(f"Valmode: State: {state}, is_correct: {is_correct} (st: {state_is_correct}, br: {br_is_correct}, ct: {ct_is_correct})")
-
-                if is_correct:
-                    # Entity is on and at the correct brightness/color temp, so schedule the next transitions
-
-                    # Transition to next values
-                    ret = async_call_later(self._hass, random.randint(RightLight.trans_delay_min, RightLight.trans_delay_max), turn_on_next)
-                    self._addSched(ret)
-
-                    # Schedule another turn_on at next_time to start the next transition
-                    # Add 1 second to ensure next event is after trigger point
-                    remaining = max(0, int(round((next_time - dt.now()).total_seconds())))
-                    ret = async_call_later(self._hass, remaining + 1, schedule_next_turn_on)
-                    self._addSched(ret)
-                else:
-                    # Entity is not correct, so turn it on and reschedule validation
-                    #if not ct_is_correct:
-                    #    # Set color temp first if needed
-                    #    ret = async_call_later(self._hass, 0, set_color_temp)
-                    #    self._addSched(ret)
-
-                    #if not br_is_correct:
-                    #    # If brightness is wrong, turn on the light
-                    #    ret = async_call_later(self._hass, 0.25, turn_on_now)
-                    #    self._addSched(ret)
-
-                    if self._debug:
-                        self._logger.error(f"Valmode: Re-turning on")
-                    ret = async_call_later(self._hass, 0, turn_on_now)
-                    self._addSched(ret)
-
-                    if self._debug:
-                        self._logger.error(f"Valmode: Re-scheduling")
-                    # Schedule another validation
-                    ret = async_call_later(self._hass, this_transition + RightLight.validate_delay, reschedule_turn_on)
-                    self._addSched(ret)
-            else:
-                # Not in validation mode, so turn on the light and schedule the validation
-
-                ## Set color temp first
-                #ret = async_call_later(self._hass, 0, set_color_temp)
-                #self._addSched(ret)
-
-                # Turn on the light
-                ret = async_call_later(self._hass, 0.25, turn_on_now)
-                self._addSched(ret)
-
-                # Schedule another call to turn_on with same parameters but valmode=True
-                ret = async_call_later(self._hass, this_transition + RightLight.validate_delay, reschedule_turn_on)
-                self._addSched(ret)
+            self._now_data = {
+                "entity_id": self._entity,
+                "brightness": br,
+                "color_temp_kelvin": ct,
+                "transition": this_transition,
+            }
+            self._next_data = {
+                "entity_id": self._entity,
+                "brightness": br_next,
+                "color_temp_kelvin": ct_next,
+            }
+            check = ("ct", br, ct)
+            now_delay = 0.25
+            next_delay = random.randint(RightLight.trans_delay_min, RightLight.trans_delay_max)
+            validate_delay = this_transition + RightLight.validate_delay
 
         else: # Color mode
 
-            prev_rgb = self.trip_points[self._mode][prev_idx][1]
-            next_rgb = self.trip_points[self._mode][next_idx][1]
+            prev_rgb = prev_vals
+            next_rgb = next_vals
 
             if self._debug:
                 self._logger.error(f"Prev/Next: {prev_rgb}/{next_rgb}")
@@ -329,123 +263,79 @@ class RightLight:
             r_now = prev_rgb[0] + (next_rgb[0] - prev_rgb[0]) * time_ratio
             g_now = prev_rgb[1] + (next_rgb[1] - prev_rgb[1]) * time_ratio
             b_now = prev_rgb[2] + (next_rgb[2] - prev_rgb[2]) * time_ratio
-            now_rgb = [r_now, g_now, b_now]
+            # Truncate as the light service schema would, so bulbs a few ms apart send identical data
+            now_rgb = [int(r_now), int(g_now), int(b_now)]
 
             if self._debug:
                 self._logger.error(f"Final: {now_rgb} -> {time_rem}sec")
 
-            # Define callback helpers
-            async def turn_on_rgb_now(_):
-                if self._debug:
-                    self._logger.error(f"turn_on_rgb_now start")
-                await self._hass.services.async_call(
-                    "light",
-                    "turn_on",
-                    {
-                        "entity_id": self._entity,
-                        "brightness": self._brightness,
-                        "rgb_color": now_rgb,
-                        "transition": this_transition,
-                    },
-                    blocking=True,
-                )
-                if self._debug:
-                    self._logger.error(f"turn_on_rgb_now done")
-
-            async def turn_on_rgb_next(_):
-                if self._debug:
-                    self._logger.error(f"turn_on_rgb_next start")
-                remaining = max(0, int(round((next_time - dt.now()).total_seconds())))
-                await self._hass.services.async_call(
-                    "light",
-                    "turn_on",
-                    {
-                        "entity_id": self._entity,
-                        "brightness": self._brightness,
-                        "rgb_color": next_rgb,
-                        "transition": remaining,
-                    },
-                    blocking=True,
-                )
-                if self._debug:
-                    self._logger.error(f"turn_on_rgb_next done")
-
-            async def reschedule_rgb_turn_on(_):
-                if self._debug:
-                    self._logger.error(f"reschedule_rgb_turn_on start")
-                await self.turn_on(
-                    brightness=self._brightness,
-                    mode=self._mode,
-                    valmode=True,
-                    nocancel=False,
-                )
-                if self._debug:
-                    self._logger.error(f"reschedule_rgb_turn_on done")
-
-            async def schedule_next_rgb_turn_on(_):
-                if self._debug:
-                    self._logger.error(f"schedule_next_rgb_turn_on start")
-                await self.turn_on(
-                    brightness=self._brightness,
-                    mode=self._mode,
-                    valmode=False,
-                    nocancel=False,
-                )
-                if self._debug:
-                    self._logger.error(f"schedule_next_rgb_turn_on done")
+            self._now_data = {
+                "entity_id": self._entity,
+                "brightness": self._brightness,
+                "rgb_color": now_rgb,
+                "transition": this_transition,
+            }
+            self._next_data = {
+                "entity_id": self._entity,
+                "brightness": self._brightness,
+                "rgb_color": next_rgb,
+            }
+            check = ("rgb", now_rgb, self._brightness)
+            now_delay = 0
+            next_delay = 0
+            validate_delay = this_transition + 1
+
+        self._now_service = "turn_on"
+        self._next_time = next_time
+
+        if this_valmode:
+            # In validation mode, verify the entity is on and at the correct brightness and color
+            # If it is, schedule the next transitions
+            # If it's not, turn it on again and schedule another validation
+            state = self._hass.states.get(self._entity)
+            is_correct = self._stateMatches(state, check)
 
-            if this_valmode:
-                # In validation mode, verify that the lights turned on and to the correct color, then start the next transition.
-                # If not, turn it on again and schedule another validation
+            if self._debug:
+                self._logger.error(f"Valmode: State: {state}, is_correct: {is_correct}")
 
-                state = self._hass.states.get(self._entity)
-                is_correct = (state is not None and state.state == "on")
-                # Check brightness and color temp
-                if is_correct and "rgb_color" in state.attributes:
-                    is_correct = is_correct and all(
-                        abs(state.attributes["rgb_color"][i] - now_rgb[i]) < RightLight.validate_color_threshold for i in range(3)
-                    )
+            if is_correct:
+                self._retries = 0
 
                 if self._debug:
-                    self._logger.error(f"Valmode: State: {state}, is_correct: {is_correct}")
-
-                if is_correct:
-                    # Entity is on and at the correct color, so schedule the next transitions
-
-                    # Transition to next values
-                    if self._debug:
-                        self._logger.error(f"Valmode: Transitioning to next color ({next_rgb} in {time_rem}sec)")
-                    ret = async_call_later(self._hass, 0, turn_on_rgb_next)
-                    self._addSched(ret)
-
-                    # Schedule another turn_on at next_time to start the next transition
-                    # Add 1 second to ensure next event is after trigger point
-                    if self._debug:
-                        self._logger.error(f"Valmode: Scheduling next color change at {next_time}")
-                    remaining = max(0, int(round((next_time - dt.now()).total_seconds())))
-                    ret = async_call_later(self._hass, remaining + 1, schedule_next_rgb_turn_on)
-                    self._addSched(ret)
-                else:
-                    # Entity is not correct, so turn it on again and reschedule validation
-                    if self._debug:
-                        self._logger.error(f"Valmode: Re-turning on")
-                    ret = async_call_later(self._hass, 0, turn_on_rgb_now)
-                    self._addSched(ret)
-
-                    if self._debug:
-                        self._logger.error(f"Valmode: Re-scheduling")
-                    # Schedule another validation
-                    ret = async_call_later(self._hass, this_transition + 1, reschedule_rgb_turn_on)
-                    self._addSched(ret)
+                    self._logger.error(f"Valmode: Transitioning to next values, next change at {next_time}")
+                self._scheduleNext(next_time, next_delay)
             else:
-                # Not in validation mode, so turn on the light and schedule the validation
-                ret = async_call_later(self._hass, 0, turn_on_rgb_now)
-                self._addSched(ret)
-
-                # Schedule another call to turn_on with same parameters but valmode=True
-                ret = async_call_later(self._hass, this_transition + 1, reschedule_rgb_turn_on)
-                self._addSched(ret)
-
+                # Turn it on again and schedule another validation with backoff, brought forward if the entity
+                # reports the target first.  Nothing is sent if the circuit breaker opened instead.
+                backoff = self._retryDelay(validate_delay, _Action.VALIDATE)
+                if backoff is not None:
+                    if self._debug:
+                        self._logger.error(f"Valmode: Re-turning on, re-validating in {backoff:.1f}sec")
+                    self._scheduleSend(0, _Action.VALIDATE, backoff)
+                    self._watchState(check, _Action.VALIDATE)
+        elif self._alreadyAt(check):
+            # The entity already shows the target, so skip the send and the validation
+            if self._debug:
+                self._logger.error(f"Already at target, next change at {next_time}")
+            self.skipped_sends += 1
+            self._scheduleNext(next_time, next_delay)
+        else:
+            # Not in validation mode, so turn on the light and schedule the validation, brought forward if the
+            # entity reports the target first
+            self._scheduleSend(now_delay, _Action.VALIDATE, validate_delay)
+            self._watchState(check, _Action.VALIDATE)
+
+    def _scheduleNext(self, next_time, next_delay):
+        """Transition to the next values, then turn_on again at next_time to start the following transition"""
+        if self._mode != "Normal" and self._ticker.handles(self._mode):
+            # Later boundaries of this mode are shared with every other light in it
+            self._schedule(_Action.SEND_NEXT, next_delay)
+            self._ticker_mode = self._mode
+            self._ticker.subscribe(self._mode, self, next_time)
+        else:
+            # Add 1 second to ensure next event is after trigger point
+            remaining = max(0, int(round((next_time - dt.now()).total_seconds())))
+            self._schedule(_Action.SEND_NEXT, next_delay, _Action.RESTART, remaining + 1)
 
     # Helper function to be used to create a task and run a coroutine in the future
     async def delay_run(self, seconds, coro, *args, **kwargs):
@@ -463,10 +353,12 @@ class RightLight:
     #        self._logger.error(f"_turn_on_specific: {data}")
     #    await self._hass.services.async_call("light", "turn_on", data)
 
-    async def turn_on_specific(self, data) -> None:
+    async def turn_on_specific(self, data, priority=PRIORITY_INTERACTIVE, zone=None) -> None:
         """External version of _turn_on_specific that runs twice to ensure successful transition"""
         if self._debug:
             self._logger.error(f"turn_on_specific: {data}")
+        if not self._claim(zone, priority):
+            return
         await self.disable()
 
         # Make a copy of data to avoid modifying the shared dict
@@ -481,7 +373,7 @@ class RightLight:
         data["entity_id"] = self._entity
 
         # await self._turn_on_specific(data)
-        await self._hass.services.async_call("light", "turn_on", data)
+        await self._outbound.async_call("light", "turn_on", data, priority=priority, zone=self._zone)
 
         # Removing second call - if things break, this may be why
         # self._hass.loop.call_later(
@@ -492,212 +384,322 @@ class RightLight:
         """
         :key valmode: If True, verify that the lights turned off
                         If False, schedule a turn_off with valmode=True
+        :key priority: Outbound priority class of the first send.  Validation re-sends are always background.
+        :key zone: Name of the commanding zone.  Omitted by RightLight's own follow-up calls.
         """
+        if "zone" in kwargs and not self._claim(kwargs["zone"], kwargs.get("priority", PRIORITY_INTERACTIVE)):
+            return
+
         # Cancel any pending eventloop schedules
         if self._debug:
             self._logger.error(f"turn_off")
         self._cancelSched()
 
         valmode = kwargs.get("valmode", False)
+        if not valmode:
+            self._resetRetries()
+        self._priority = PRIORITY_BACKGROUND if valmode else kwargs.get("priority", PRIORITY_INTERACTIVE)
 
         self._brightness = 0
 
-        async def turn_off_now(_):
-            await self._hass.services.async_call(
-                "light",
-                "turn_off",
-                {
-                    "entity_id": self._entity,
-                    "transition": kwargs.get("transition", self.off_transition),
-                },
-            )
-
-        async def reschedule_turn_off(_):
-            await self.disable_and_turn_off(valmode=True)
+        self._now_service = "turn_off"
+        self._now_data = {
+            "entity_id": self._entity,
+            "transition": kwargs.get("transition", self.off_transition),
+        }
+        check = ("off",)
+        validate_delay = self.off_transition + RightLight.validate_delay
 
         if valmode:
             state = self._hass.states.get(self._entity)
-            is_off = (state is None or state.state != "on")
+            is_off = self._stateMatches(state, check)
 
             if self._debug:
                 self._logger.error(f"Valmode: State: {state}, is_off: {is_off}")
 
-            if not is_off:
-                # Entity is not off, so turn it off
-                ret = async_call_later(self._hass, 0, turn_off_now)
-                self._addSched(ret)
-
-                # Schedule another validation
-                ret = async_call_later(self._hass, self.off_transition + RightLight.validate_delay, reschedule_turn_off)
-                self._addSched(ret)
+            if is_off:
+                self._retries = 0
+            else:
+                # Entity is not off, so turn it off and schedule another validation with backoff, brought forward
+                # if the entity reports off first.  Nothing is sent if the circuit breaker opened instead.
+                backoff = self._retryDelay(validate_delay, _Action.VALIDATE_OFF)
+                if backoff is not None:
+                    self._scheduleSend(0, _Action.VALIDATE_OFF, backoff)
+                    self._watchState(check, _Action.VALIDATE_OFF)
+        elif self._alreadyAt(check):
+            # Already off, so there is nothing to send or validate
+            self.skipped_sends += 1
         else:
-            ret = async_call_later(self._hass, 0, turn_off_now)
-            self._addSched(ret)
+            self._scheduleSend(0, _Action.VALIDATE_OFF, validate_delay)
+            self._watchState(check, _Action.VALIDATE_OFF)
 
-            ret = async_call_later(self._hass, self.off_transition + RightLight.validate_delay, reschedule_turn_off)
-            self._addSched(ret)
+    def _claim(self, zone, priority) -> bool:
+        """
+        Arbitrate between zones sharing this light.  A command is refused while another zone's more urgent
+        command is still in effect, so motion or background traffic from one zone can't undo a switch press
+        in another.  Otherwise the commanding zone becomes the owner.
+        """
+        if zone != self._zone and self.active and priority > self._owner_priority:
+            if self._debug:
+                self._logger.error(f"Refused {zone} (priority {priority}): owned by {self._zone} ({self._owner_priority})")
+            self.refused += 1
+            return False
+        self._zone = zone
+        self._owner_priority = priority
+        return True
+
+    @property
+    def owner(self):
+        """Name of the zone whose command this light is following"""
+        return self._zone
 
     async def disable(self):
         # Cancel any pending eventloop schedules
         self._cancelSched()
 
-    def _cancelSched(self):
-        if self._debug:
-            self._logger.error(f"_cancelSched: {len(self._currSched)}")
-        while self._currSched:
-            ret = self._currSched.pop(0)
-            if callable(ret):
-                ret()
-            else:
-                ret.cancel()
-        # for ret in self._currSched:
-        #    ret.cancel()
-        if self._debug:
-            self._logger.error(f"_cancelSched End: {len(self._currSched)}")
+    def _schedule(self, action, delay, next_action=None, next_delay=0):
+        """
+        Arm the timer to run 'action' in 'delay' seconds, followed by 'next_action' 'next_delay' seconds from
+        now.  If the follow-up is due first, only the follow-up is kept, since it restarts the cycle anyway.
+        """
+        now = self._hass.loop.time()
+        if next_action is not None and next_delay <= delay:
+            action, delay, next_action = next_action, next_delay, None
 
-    def _addSched(self, ret):
-        # FIFO of event callbacks to ensure all are properly cancelled
-        # if len(self._currSched) >= 3:
-        #    self._currSched.pop(0)
-        if self._debug:
-            self._logger.error(f"_addSched: {len(self._currSched)}")
-        self._currSched.append(ret)
-        if self._debug:
-            self._logger.error(f"_addSched End: {len(self._currSched)}")
+        self._action = action
+        self._next_action = next_action or _Action.NONE
+        self._next_deadline = now + next_delay
+        self._arm(now + delay)
 
-    def _getNow(self):
-        self.now = dt.now()
-        rerun = date.today() != self.today
-        self.today = date.today()
+    def _scheduleSend(self, delay, validate_action, validate_delay):
+        """
+        Arm the timer to send the SEND_NOW target in 'delay' seconds, then run 'validate_action'
+        'validate_delay' seconds after the outbound call completes.  Time spent queued behind the outbound
+        rate limits doesn't count against the validation, so a queued command isn't judged failed and re-sent.
+        """
+        self._resolveSent()
+        self._schedule(_Action.SEND_NOW, delay)
+        self._after_send = (validate_action, validate_delay, self._hass.loop.create_future())
 
-        if rerun:
-            self.sunrise = dt.as_local(self.sun.get_sunrise_time())
-            self.sunset = dt.as_local(self.sun.get_sunset_time())
-            self.sunrise = self.sunrise.replace(
-                day=self.now.day, month=self.now.month, year=self.now.year
-            )
-            self.sunset = self.sunset.replace(
-                day=self.now.day, month=self.now.month, year=self.now.year
-            )
-            self.midnight_early = self.now.replace(
-                microsecond=0, second=0, minute=0, hour=0
-            )
-            self.midnight_thirty = self.now.replace(
-                #microsecond=0, second=0, minute=0, hour=0
-                microsecond=0, second=0, minute=30, hour=0
-            )
-            self.ten_thirty = self.now.replace(
-                microsecond=0, second=0, minute=30, hour=22
-            )
-            self.midnight_late = self.now.replace(
-                microsecond=0, second=59, minute=59, hour=23
-            )
+    def pendingSend(self):
+        """
+        Return a future completing once the send for this light's latest command has gone out, or was
+        cancelled by a newer command, or None if no send is pending
+        """
+        return self._after_send[2] if self._after_send is not None else None
+
+    def _resolveSent(self):
+        if self._after_send is not None and not self._after_send[2].done():
+            self._after_send[2].set_result(None)
+
+    def _arm(self, deadline):
+        if self._timer is not None:
+            if deadline == self._deadline:
+                return
+            self._timer.cancel()
+        self._deadline = deadline
+        self._timer = self._hass.loop.call_at(deadline, self._onTimer)
+
+    @callback
+    def _onTimer(self):
+        action = self._action
+        self._timer = None
+
+        # Queue up the follow-up before running, so the action itself may replace it
+        if self._next_action is not _Action.NONE:
+            self._action = self._next_action
+            self._next_action = _Action.NONE
+            self._arm(self._next_deadline)
+        else:
+            self._action = _Action.NONE
 
-            self.defineTripPoints()
+        self._hass.async_create_task(self._runAction(action))
 
-    def defineTripPoints(self):
-        self.trip_points["Normal"] = []
-        timestep = timedelta(minutes=2)
-
-        # In debug mode, add in drastic changes every two minutes to increase observability
-        if self._debug == 2:
-            debug_trip_points = [[2500, 120], [4000, 255]]
-            self.trip_points["Normal"] = self.enumerateTripPoints(
-                timestep / 8, debug_trip_points
+    async def _runAction(self, action):
+        if self._debug:
+            self._logger.error(f"_runAction: {action}")
+
+        if action is _Action.SEND_NOW:
+            after_send = self._after_send
+            try:
+                await self._send(self._now_service, self._now_data, self._priority)
+            finally:
+                # Unless a newer command replaced this one while it was queued
+                if after_send is not None and self._after_send is after_send:
+                    self._resolveSent()
+                    self._after_send = None
+                    self._schedule(after_send[0], after_send[1])
+        elif action is _Action.SEND_NEXT:
+            data = dict(self._next_data)
+            data["transition"] = max(0, int(round((self._next_time - dt.now()).total_seconds())))
+            await self._send("turn_on", data, PRIORITY_BACKGROUND)
+        elif action is _Action.VALIDATE or action is _Action.RESTART:
+            await self.turn_on(
+                brightness=self._brightness,
+                brightness_override=self._brightness_override,
+                mode=self._mode,
+                valmode=action is _Action.VALIDATE,
+                priority=PRIORITY_BACKGROUND,
             )
-        else:
-            self.trip_points["Normal"].append([self.midnight_early,                  [2500, 150]])  # Midnight night
-            self.trip_points["Normal"].append([self.midnight_thirty,                 [2000, 10 ]])  # Midnight morning
-            self.trip_points["Normal"].append([self.sunrise - timedelta(minutes=15), [2000, 10 ]])  # Sunrise - 15
-            self.trip_points["Normal"].append([self.sunrise + timedelta(minutes=30), [4700, 255]])  # Sunrise + 30
-            self.trip_points["Normal"].append([self.sunset  - timedelta(minutes=90), [4200, 255]])  # Sunset - 90
-            self.trip_points["Normal"].append([self.sunset  - timedelta(minutes=30), [3200, 255]])  # Sunset - 30
-            self.trip_points["Normal"].append([self.sunset,                          [3000, 255]])  # Sunset
-            self.trip_points["Normal"].append([self.ten_thirty,                      [2700, 255]])  # 10:30
-            self.trip_points["Normal"].append(self.trip_points["Normal"][0])  # Midnight night
-
-        vivid_trip_points = [
-            [255, 0, 0],
-            [202, 0, 127],
-            [130, 0, 255],
-            [0, 0, 255],
-            [0, 90, 190],
-            [0, 200, 200],
-            [0, 255, 0],
-            [255, 255, 0],
-            [255, 127, 0],
-        ]
-
-        bright_trip_points = [
-            [255, 100, 100],
-            [202, 80, 127],
-            [150, 70, 255],
-            [90, 90, 255],
-            [60, 100, 190],
-            [70, 200, 200],
-            [80, 255, 80],
-            [255, 255, 0],
-            [255, 127, 70],
-        ]
-
-        calm_trip_points = [
-            [255, 0, 0],
-            [202, 0, 127],
-            [130, 0, 255],
-            [0, 0, 255],
-            [0, 90, 190],
-            [0, 200, 200],
-            [0, 255, 0],
-            [255, 127, 0],
-        ]
-
-        one_trip_points = [[0, 104, 255], [255, 0, 255]]
-
-        two_trip_points = [[255, 0, 255], [0, 104, 255]]
-
-        # Loop to create vivid trip points
-        self.trip_points["Vivid"] = self.enumerateTripPoints(
-            timestep, vivid_trip_points
-        )
+        elif action is _Action.VALIDATE_OFF:
+            await self.disable_and_turn_off(valmode=True)
 
-        # Faster timestep for Fun1 mode
-        self.trip_points["Fun1"] = self.enumerateTripPoints(
-            timestep / 8, vivid_trip_points
-        )
+    @callback
+    def _advanceCycle(self, next_time, next_rgb):
+        """Called by the CycleTicker at a trip point boundary, to start the transition to the next color"""
+        state = self._hass.states.get(self._entity)
+        if not self._stateMatches(state, ("rgb", self._next_data["rgb_color"], self._next_data["brightness"])):
+            # Didn't reach the previous color, so drive and validate this light on its own again
+            if self._debug:
+                self._logger.error(f"_advanceCycle: out of step: {state}")
+            self._hass.async_create_task(self._runAction(_Action.RESTART))
+            return
 
-        # Faster timestep for Fun2 mode, time shifted from Fun1
-        self.trip_points["Fun2"] = self.enumerateTripPoints(
-            timestep / 32, bright_trip_points[1:] + [bright_trip_points[0]]
-        )
+        self._next_data["rgb_color"] = next_rgb
+        self._next_time = next_time
+        self._hass.async_create_task(self._runAction(_Action.SEND_NEXT))
 
-        # Loop to create bright trip points
-        self.trip_points["Bright"] = self.enumerateTripPoints(
-            timestep, bright_trip_points
+    async def _send(self, service, data, priority):
+        await self._outbound.async_call(
+            "light", service, data, blocking=service == "turn_on", priority=priority, zone=self._zone
         )
 
-        # Loop to create calm trip points
-        self.trip_points["Calm"] = self.enumerateTripPoints(timestep, calm_trip_points)
+    def _watchState(self, check, action):
+        """
+        Run 'action' as soon as the entity reports a state matching 'check', bringing forward the timed
+        validation that remains scheduled as the fallback
+        """
+        self._watch_check = check
+        self._watch_action = action
+        if self._unsub_state is None:
+            self._unsub_state = async_track_state_change_event(self._hass, self._entity, self._onStateChanged)
+
+    @callback
+    def _onStateChanged(self, ev):
+        if self._watch_action is _Action.NONE:
+            return
+        new_state = ev.data.get("new_state")
+        if not self._stateMatches(new_state, self._watch_check):
+            return
+        if self._debug:
+            self._logger.error(f"_onStateChanged: target reported: {new_state}")
 
-        # Loop to create 'one' trip points
-        self.trip_points["One"] = self.enumerateTripPoints(timestep, one_trip_points)
+        action = self._watch_action
+        self._watch_action = _Action.NONE
+        if self.breaker_open:
+            self._resetRetries()
+        self._hass.async_create_task(self._runAction(action))
 
-        # Loop to create 'two' trip points
-        self.trip_points["Two"] = self.enumerateTripPoints(timestep, two_trip_points)
+    def _retryDelay(self, delay, action):
+        """
+        Return how long to wait before the next validation after a failed one, backing off exponentially from
+        'delay' with random jitter.  After retry_max_attempts failures in a row, open the circuit breaker and
+        return None instead: nothing more is sent until the entity reports a state again, then 'action' runs
+        and retries start over.
+        """
+        self._retries += 1
+        self.retry_count += 1
+
+        if self._retries > RightLight.retry_max_attempts:
+            self.breaker_open = True
+            self.breaker_trips += 1
+            self._logger.warning(f"No response after {self._retries - 1} retries, waiting for {self._entity} to report a state")
+            self._watchState(("reporting",), action)
+            return None
+
+        backoff = min(delay * 2 ** (self._retries - 1), RightLight.retry_max_delay)
+        return backoff + random.uniform(0, RightLight.retry_jitter_max)
+
+    def _resetRetries(self):
+        if self.breaker_open:
+            self._logger.info(f"Closing circuit breaker for {self._entity}")
+        self._retries = 0
+        self.breaker_open = False
+
+    def _alreadyAt(self, check):
+        """Return True if the entity's cached state already satisfies check, so a send would change nothing"""
+        state = self._hass.states.get(self._entity)
+        if state is None or state.state in ("unavailable", "unknown"):
+            return False
+        return self._stateMatches(state, check, strict=True)
 
-    def getColorModes(self):
-        return list(self.trip_points.keys())
+    @staticmethod
+    def _stateMatches(state, check, strict=False):
+        """
+        Return True if state satisfies check, one of ("ct", br, ct), ("rgb", rgb, br), ("off",) or ("reporting",)
+
+        :param strict: Count an attribute the entity doesn't report as a mismatch, as needed before skipping a
+                       send.  Otherwise validation accepts a light that doesn't report its color or brightness.
+        """
+        kind = check[0]
+        if kind == "off":
+            return state is None or state.state != "on"
+        if kind == "reporting":
+            return state is not None and state.state not in ("unavailable", "unknown")
+        if state is None or state.state != "on":
+            return False
+        if kind == "ct":
+            return (
+                abs((state.attributes.get("brightness") or -1) - check[1]) < RightLight.validate_brightness_threshold
+                and abs((state.attributes.get("color_temp_kelvin") or -1) - check[2]) < RightLight.validate_ct_threshold
+            )
+        rgb = state.attributes.get("rgb_color")
+        brightness = state.attributes.get("brightness")
+        if strict and (not rgb or brightness is None):
+            return False
+        if brightness is not None and abs(brightness - check[2]) >= RightLight.validate_brightness_threshold:
+            return False
+        # Outside strict mode, an entity that doesn't report a color can't be checked further
+        return not rgb or all(abs(rgb[i] - check[1][i]) < RightLight.validate_color_threshold for i in range(3))
 
-    def enumerateTripPoints(self, time_step, trip_points):
-        temp = self.midnight_early
-        this_ptr = 0
-        toreturn = []
-        while temp < self.midnight_late:
-            toreturn.append([temp, trip_points[this_ptr]])
+    def _cancelSched(self):
+        if self._debug:
+            self._logger.error(f"_cancelSched: {self._action}, {self._next_action}, {self._watch_action}")
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        self._action = _Action.NONE
+        self._next_action = _Action.NONE
+        self._resolveSent()
+        self._after_send = None
+        self._watch_action = _Action.NONE
+        if self._ticker_mode is not None:
+            self._ticker.unsubscribe(self._ticker_mode, self)
+            self._ticker_mode = None
+
+    @callback
+    def async_teardown(self):
+        """Cancel everything scheduled and stop listening for state changes, once nothing holds this light"""
+        self._cancelSched()
+        if self._unsub_state is not None:
+            self._unsub_state()
+            self._unsub_state = None
+        if self._unsub_max_min is not None:
+            self._unsub_max_min()
+            self._unsub_max_min = None
 
-            temp = temp + time_step
+    def _getNow(self):
+        self.now = dt.now()
+        rerun = self.now.date() != self.today
+        self.today = self.now.date()
 
-            this_ptr += 1
-            if this_ptr >= len(trip_points):
-                this_ptr = 0
+        if rerun:
+            self.defineTripPoints()
+
+    def _getSunTimes(self):
+        """Return today's local sunrise and sunset from the shared cache"""
+        return getSunTimes(self.today, self._latitude, self._longitude)
 
-        return toreturn
+    def defineTripPoints(self):
+        """Attach to the shared trip point curves for today, building them if this is the first RightLight to ask"""
+        self._trip_table = getTripPoints(
+            self.today, self._latitude, self._longitude, self._debug, self.now, self._getSunTimes
+        )
+
+    @property
+    def active(self) -> bool:
+        """True while a send, validation or following transition is pending for this light"""
+        return self._timer is not None or self._after_send is not None or self._ticker_mode is not None
+
+    def getColorModes(self):
+        return list(self._trip_table.curves.keys())
@@ -0,0 +1,58 @@
+"""Sunrise/sunset times shared by all RightLight objects"""
+from functools import lru_cache
+from datetime import timedelta
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.event import async_track_time_change
+from homeassistant.util import dt
+import asyncio, logging
+from suntime import Sun
+
+from .const import DOMAIN
+
+_LOGGER = logging.getLogger(__name__)
+
+PREWARM_DAYS = 7
+"""Number of days after today to compute ahead of time"""
+
+
+@lru_cache(maxsize=32)
+def getSunTimes(day, latitude, longitude):
+    """Return local (sunrise, sunset) for 'day', both placed on 'day' itself"""
+    sun = Sun(latitude, longitude)
+    sunrise = dt.as_local(sun.get_sunrise_time(day))
+    sunset = dt.as_local(sun.get_sunset_time(day))
+    sunrise = sunrise.replace(day=day.day, month=day.month, year=day.year)
+    sunset = sunset.replace(day=day.day, month=day.month, year=day.year)
+    return sunrise, sunset
+
+
+async def async_prewarm(hass: HomeAssistant, days=PREWARM_DAYS) -> None:
+    """Fill the cache for today and the following 'days' days in the executor"""
+    latitude = hass.config.latitude
+    longitude = hass.config.longitude
+    today = dt.now().date()
+
+    def prewarm():
+        for offset in range(days + 1):
+            getSunTimes(today + timedelta(days=offset), latitude, longitude)
+
+    await hass.async_add_executor_job(prewarm)
+    _LOGGER.debug(f"Sun times cached through {today + timedelta(days=days)}: {getSunTimes.cache_info()}")
+
+
+async def async_setup(hass: HomeAssistant) -> None:
+    """
+    Pre-warm the cache once per Home Assistant instance and keep it topped up daily.  Platforms set up
+    concurrently all wait for the same pre-warm, so none of their RightLights compute on the event loop.
+    """
+    data = hass.data.setdefault(DOMAIN, {})
+    if "sun_times" not in data:
+        @callback
+        def daily_prewarm(_now):
+            hass.async_create_task(async_prewarm(hass))
+
+        data["sun_times_unsub"] = async_track_time_change(hass, daily_prewarm, hour=12, minute=0, second=0)
+        data["sun_times"] = hass.async_create_task(async_prewarm(hass))
+
+    # Shielded, so one platform's setup being cancelled doesn't cancel the pre-warm the others wait for
+    await asyncio.shield(data["sun_times"])
@@ -0,0 +1,215 @@
+"""Process-wide trip point tables shared read-only by all RightLight objects"""
+from datetime import timedelta
+from bisect import bisect_left
+from array import array
+import logging, sys
+
+_LOGGER = logging.getLogger(__name__)
+
+VIVID_TRIP_POINTS = (
+    (255, 0, 0),
+    (202, 0, 127),
+    (130, 0, 255),
+    (0, 0, 255),
+    (0, 90, 190),
+    (0, 200, 200),
+    (0, 255, 0),
+    (255, 255, 0),
+    (255, 127, 0),
+)
+
+BRIGHT_TRIP_POINTS = (
+    (255, 100, 100),
+    (202, 80, 127),
+    (150, 70, 255),
+    (90, 90, 255),
+    (60, 100, 190),
+    (70, 200, 200),
+    (80, 255, 80),
+    (255, 255, 0),
+    (255, 127, 70),
+)
+
+CALM_TRIP_POINTS = (
+    (255, 0, 0),
+    (202, 0, 127),
+    (130, 0, 255),
+    (0, 0, 255),
+    (0, 90, 190),
+    (0, 200, 200),
+    (0, 255, 0),
+    (255, 127, 0),
+)
+
+ONE_TRIP_POINTS = ((0, 104, 255), (255, 0, 255))
+
+TWO_TRIP_POINTS = ((255, 0, 255), (0, 104, 255))
+
+TIMESTEP = timedelta(minutes=2)
+
+_MS = timedelta(milliseconds=1)
+_US = timedelta(microseconds=1)
+
+
+class StaticCurve:
+    """Explicit list of trip points, packed as millisecond offsets from midnight and searched by bisect"""
+
+    __slots__ = ("midnight", "offsets", "values", "width")
+
+    def __init__(self, midnight, points) -> None:
+        self.midnight = midnight
+        """Datetime the offsets are measured from"""
+        self.offsets = array("i", ((tp[0] - midnight) // _MS for tp in points))
+        """Trip point times in whole milliseconds since midnight"""
+        self.width = len(points[0][1])
+        """Number of values per trip point"""
+        self.values = array("H", (v for tp in points for v in tp[1]))
+        """Trip point values, flattened 'width' at a time"""
+
+    def lookup(self, now):
+        """
+        Return (prev_time, next_time, prev_values, next_values) around 'now'
+
+        The next trip point is the first one at or after 'now', or the last one if none are.  Only the
+        entries before the last are searched, since Normal ends with a copy of its midnight entry.
+        """
+        # Round up so an integer compare matches 'trip time >= now'
+        now_ms = -((self.midnight - now) // _MS)
+        next_idx = bisect_left(self.offsets, now_ms, 0, len(self.offsets) - 1)
+        prev_idx = next_idx - 1 if next_idx else len(self.offsets) - 1
+        return (
+            self.midnight + timedelta(milliseconds=self.offsets[prev_idx]),
+            self.midnight + timedelta(milliseconds=self.offsets[next_idx]),
+            tuple(self.values[prev_idx * self.width:(prev_idx + 1) * self.width]),
+            tuple(self.values[next_idx * self.width:(next_idx + 1) * self.width]),
+        )
+
+    def nbytes(self):
+        """Approximate memory used by the packed trip points"""
+        return sys.getsizeof(self.offsets) + sys.getsizeof(self.values)
+
+
+class CyclicCurve:
+    """Palette repeated at a constant time step from midnight, evaluated without materializing the day"""
+
+    __slots__ = ("step", "palette")
+
+    def __init__(self, step, palette) -> None:
+        self.step = step
+        """Time between palette entries"""
+        self.palette = palette
+        """Tuple of values, repeated in order through the day"""
+
+    def lookup(self, now):
+        """
+        Return (prev_time, next_time, prev_values, next_values) around 'now'
+
+        Gives the same answer as a StaticCurve holding every step from midnight until 23:59:59.
+        """
+        midnight_early = now.replace(microsecond=0, second=0, minute=0, hour=0)
+        midnight_late = now.replace(microsecond=0, second=59, minute=59, hour=23)
+
+        # Number of steps in the day, and index of the first step at or after now, in integer microseconds
+        step_us = self.step // _US
+        count = -((midnight_early - midnight_late) // _US // step_us)
+        steps, rem = divmod((now - midnight_early) // _US, step_us)
+        next_idx = min(steps if not rem else steps + 1, count - 1)
+        prev_idx = next_idx - 1 if next_idx else count - 1
+
+        return (
+            midnight_early + self.step * prev_idx,
+            midnight_early + self.step * next_idx,
+            self.palette[prev_idx % len(self.palette)],
+            self.palette[next_idx % len(self.palette)],
+        )
+
+
+# Color cycling modes are the same every day, so are shared by all tables
+CYCLIC_CURVES = {
+    "Vivid": CyclicCurve(TIMESTEP, VIVID_TRIP_POINTS),
+    # Faster timestep for Fun1 mode
+    "Fun1": CyclicCurve(TIMESTEP / 8, VIVID_TRIP_POINTS),
+    # Faster timestep for Fun2 mode, time shifted from Fun1
+    "Fun2": CyclicCurve(TIMESTEP / 32, BRIGHT_TRIP_POINTS[1:] + BRIGHT_TRIP_POINTS[:1]),
+    "Bright": CyclicCurve(TIMESTEP, BRIGHT_TRIP_POINTS),
+    "Calm": CyclicCurve(TIMESTEP, CALM_TRIP_POINTS),
+    "One": CyclicCurve(TIMESTEP, ONE_TRIP_POINTS),
+    "Two": CyclicCurve(TIMESTEP, TWO_TRIP_POINTS),
+}
+
+# In debug mode, add in drastic changes every two minutes to increase observability
+DEBUG_NORMAL_CURVE = CyclicCurve(TIMESTEP / 8, ((2500, 120), (4000, 255)))
+
+
+class TripPointTable:
+    """Immutable trip point curves for every mode on one day at one location"""
+
+    __slots__ = ("curves", "nbytes")
+
+    def __init__(self, normal) -> None:
+        self.curves = {"Normal": normal, **CYCLIC_CURVES}
+        """Dictionary of mode name to curve"""
+        self.nbytes = normal.nbytes() if isinstance(normal, StaticCurve) else 0
+        """Approximate memory used by this table's own trip points"""
+
+    def lookup(self, mode, now):
+        """Return (prev_time, next_time, prev_values, next_values) around 'now' for 'mode'"""
+        return self.curves[mode].lookup(now)
+
+
+# Tables keyed by (date, latitude, longitude, debug level).  Only the current day is kept.
+_tables = {}
+
+
+def getTripPoints(today, latitude, longitude, debug, now, get_sun_times):
+    """
+    Return the shared TripPointTable for 'today', building it on first use
+
+    :param now: Current local datetime, used to derive the day's fixed trip times
+    :param get_sun_times: Callable returning local (sunrise, sunset), only called on a cache miss
+    """
+    key = (today, latitude, longitude, debug)
+    table = _tables.get(key)
+    if table is None:
+        if debug == 2:
+            table = TripPointTable(DEBUG_NORMAL_CURVE)
+        else:
+            sunrise, sunset = get_sun_times()
+            table = TripPointTable(_buildNormalCurve(now, sunrise, sunset))
+
+        # Drop tables from previous days
+        for old_key in [k for k in _tables if k[0] != today]:
+            del _tables[old_key]
+        _tables[key] = table
+
+        _LOGGER.debug(f"Built trip point table for {key}: {table.nbytes} bytes")
+
+    return table
+
+
+def cacheStats():
+    """Return the number of cached trip point tables and their approximate total size in bytes"""
+    return {
+        "tables": len(_tables),
+        "bytes": sum(table.nbytes for table in _tables.values()),
+    }
+
+
+def _buildNormalCurve(now, sunrise, sunset):
+    midnight_early = now.replace(microsecond=0, second=0, minute=0, hour=0)
+    midnight_thirty = now.replace(microsecond=0, second=0, minute=30, hour=0)
+    ten_thirty = now.replace(microsecond=0, second=0, minute=30, hour=22)
+
+    midnight_night = (midnight_early, (2500, 150))
+    return StaticCurve(midnight_early, (
+        midnight_night,                                     # Midnight night
+        (midnight_thirty,                 (2000, 10 )),     # Midnight morning
+        (sunrise - timedelta(minutes=15), (2000, 10 )),     # Sunrise - 15
+        (sunrise + timedelta(minutes=30), (4700, 255)),     # Sunrise + 30
+        (sunset  - timedelta(minutes=90), (4200, 255)),     # Sunset - 90
+        (sunset  - timedelta(minutes=30), (3200, 255)),     # Sunset - 30
+        (sunset,                          (3000, 255)),     # Sunset
+        (ten_thirty,                      (2700, 255)),     # 10:30
+        midnight_night,                                     # Midnight night
+    ))
+